@@ -14,12 +14,23 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import models, schemas, database
-from passlib.hash import bcrypt  # For password hashing
+from passlib.context import CryptContext  # For password hashing
 import jwt  # For creating and verifying JSON Web Tokens
 import os
-from datetime import datetime, timedelta
+import asyncio
+import base64
+import hashlib
+import hmac
+import threading
+import time
+import orjson  # Fast JSON encoder for token payloads
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 # Create a FastAPI router for authentication endpoints
 # All routes in this module will be prefixed with "/auth"
@@ -35,7 +46,134 @@ security = HTTPBearer()
 # JWT tokens are used to maintain user sessions securely
 # They contain encrypted hotel information that proves identity
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
-JWT_ALGORITHM = "HS256"  # Algorithm used for signing JWT tokens
+JWT_ALGORITHM = "HS256"  # Algorithm used for signing JWT tokens (see create_access_token)
+ACCESS_TOKEN_EXPIRE_SECONDS = 24 * 60 * 60  # Tokens are valid for 24 hours
+
+# Claims each kind of token must carry - enforced by PyJWT while decoding
+HOTEL_TOKEN_REQUIRED_CLAIMS = ["exp", "hotel_id", "hotel_name"]
+AGENT_TOKEN_REQUIRED_CLAIMS = ["exp", "agent_id", "agent_name"]
+
+# =============================================================================
+# PASSWORD HASHING CONFIGURATION
+# =============================================================================
+# bcrypt's cost doubles with every extra round, and login/register spend most of
+# their time hashing. BCRYPT_ROUNDS lets ops tune the cost to the deploy hardware
+# (aim for roughly 250 ms per hash) without touching the code.
+# Existing hashes keep working; they are re-hashed at the new cost on next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Hash checked against when the email is unknown, so a failed login takes the
+# same time whether or not the account exists (no email enumeration by timing)
+_DUMMY_PASSWORD_HASH = pwd_context.hash("dummy-password-never-matches")
+
+# bcrypt is pure CPU work, so login endpoints run it on this dedicated pool
+# instead of FastAPI's shared threadpool. Capping it at the core count keeps a
+# burst of logins from oversubscribing the CPU or starving other routes.
+_password_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="bcrypt")
+
+async def _run_in_password_pool(func, *args):
+    """
+    Runs a password hashing/verification call on the bcrypt pool.
+    
+    Example:
+        ok = await _run_in_password_pool(pwd_context.verify, password, stored_hash)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_pool, func, *args)
+
+def _find_by_email(db: Session, model, email: str):
+    """
+    Looks up a hotel or travel agent account by email (None if there is none).
+    
+    The login endpoints are async (for the bcrypt pool), so they run this
+    blocking query via run_in_threadpool to keep the event loop free.
+    """
+    return db.query(model).filter(model.email == email).first()
+
+# =============================================================================
+# VALIDATED TOKEN CACHE
+# =============================================================================
+# Every authenticated request used to decode its JWT from scratch (HMAC check +
+# JSON parsing). Clients send the same token many times in a row, so we
+# remember the result of a successful validation for a short while.
+# An entry lives at most TOKEN_CACHE_TTL_SECONDS and never past the token's own
+# expiry, so an expired token is still rejected on time.
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_MAX_SIZE = 10_000
+
+class _TokenCache:
+    """
+    Small thread-safe TTL cache keyed by a digest of the raw token string.
+    
+    Uvicorn runs sync dependencies in a threadpool, so access is guarded by a lock.
+    Only a 16-byte digest of the token is kept as the key, never the token itself.
+    Once full, the oldest entry is dropped (O(1), like routes._ResultCache);
+    expired entries are dropped when they are looked up.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE):
+        self._entries = OrderedDict()  # digest -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self._max_size = max_size
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, key: bytes):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                # Entry outlived the token (or our TTL) - force a full validation
+                del self._entries[key]
+                return None
+            return value
+
+    def put(self, key: bytes, value, token_exp: float):
+        now = time.time()
+        expires_at = min(token_exp, now + TOKEN_CACHE_TTL_SECONDS)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+# Hotel and travel agent tokens are cached separately so one kind of token can
+# never be served from the other's cache
+_hotel_token_cache = _TokenCache()
+_agent_token_cache = _TokenCache()
+
+# Identities carried by validated tokens (see get_current_hotel and
+# get_current_agent_claims). Slotted, frozen dataclasses: cheap attribute
+# access, small per-instance size, and immutable - cached instances are shared
+# by every request presenting the same token.
+@dataclass(slots=True, frozen=True)
+class HotelClaims:
+    hotel_id: int
+    hotel_name: str
+
+@dataclass(slots=True, frozen=True)
+class AgentClaims:
+    id: int
+    name: str
+
+# =============================================================================
+# TOKEN SIGNING
+# =============================================================================
+# Our tokens always carry the same header, so it is base64-encoded once here
+# and only the payload is serialized per token. Tokens are signed with plain
+# HMAC-SHA256, which is exactly what jwt.decode verifies for HS256.
+
+def _b64url(data: bytes) -> bytes:
+    """Unpadded URL-safe base64, as used by JWT."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+_JWT_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+_JWT_SIGNING_KEY = JWT_SECRET_KEY.encode()
 
 def create_access_token(data: dict):
     """
@@ -54,13 +192,18 @@ def create_access_token(data: dict):
     Example:
         token = create_access_token({"hotel_id": 123, "hotel_name": "Grand Hotel"})
     """
-    to_encode = data.copy()  # Copy the data to avoid modifying original
-    expire = datetime.utcnow() + timedelta(hours=24)  # Token expires in 24 hours
-    to_encode.update({"exp": expire})  # Add expiration time to token
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
-    return encoded_jwt
+    # Token expires in 24 hours - exp is a plain Unix timestamp, as JWT expects
+    expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_SECONDS
+    
+    # New dict with the expiration time added - the caller's data is left untouched
+    payload = orjson.dumps({**data, "exp": expire})
+    
+    # header.payload, signed with HMAC-SHA256 and the signature appended
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(payload)
+    signature = hmac.new(_JWT_SIGNING_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode()
 
-def get_current_hotel(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+def get_current_hotel(credentials: HTTPAuthorizationCredentials = Depends(security)) -> HotelClaims:
     """
     Authentication dependency function that validates JWT tokens.
     
@@ -78,36 +221,44 @@ def get_current_hotel(credentials: HTTPAuthorizationCredentials = Depends(securi
         credentials: Automatically injected by FastAPI from Authorization header
     
     Returns:
-        dict: {"hotel_id": int, "hotel_name": str} - Information about authenticated hotel
+        HotelClaims: hotel_id and hotel_name of the authenticated hotel
     
     Raises:
         HTTPException: 401 error if token is invalid, expired, or missing hotel info
     
     Usage:
         @app.get("/protected-route")
-        def protected(current_hotel: dict = Depends(get_current_hotel)):
-            hotel_id = current_hotel["hotel_id"]  # Get the authenticated hotel's ID
+        def protected(current_hotel: HotelClaims = Depends(get_current_hotel)):
+            hotel_id = current_hotel.hotel_id  # Get the authenticated hotel's ID
     """
+    # Extract the actual token from "Bearer <token>"
+    token = credentials.credentials
+    
+    # Fast path: this exact token was validated recently
+    cache_key = _TokenCache.key(token)
+    cached_hotel = _hotel_token_cache.get(cache_key)
+    if cached_hotel is not None:
+        return cached_hotel
+    
     try:
-        # Extract the actual token from "Bearer <token>"
-        token = credentials.credentials
-        
         # Decode and verify the JWT token
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        # PyJWT also checks that exp, hotel_id and hotel_name are present,
+        # so a token without hotel information fails right here
+        payload = jwt.decode(
+            token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM],
+            options={"require": HOTEL_TOKEN_REQUIRED_CLAIMS}
+        )
         
-        # Extract hotel information from token payload
-        hotel_id = payload.get("hotel_id")
-        hotel_name = payload.get("hotel_name")
-        
-        # Ensure both hotel_id and hotel_name are present
-        if not hotel_id or not hotel_name:
-            raise HTTPException(status_code=401, detail="Invalid token: missing hotel information")
-            
-        return {"hotel_id": hotel_id, "hotel_name": hotel_name}
+        current_hotel = HotelClaims(hotel_id=payload["hotel_id"], hotel_name=payload["hotel_name"])
+        _hotel_token_cache.put(cache_key, current_hotel, payload["exp"])
+        return current_hotel
     
     except jwt.ExpiredSignatureError:
         # Token has expired (older than 24 hours)
         raise HTTPException(status_code=401, detail="Token has expired")
+    except jwt.MissingRequiredClaimError:
+        # Token is valid but was not issued to a hotel (e.g. a travel agent token)
+        raise HTTPException(status_code=401, detail="Invalid token: missing hotel information")
     except jwt.InvalidTokenError:
         # Token is malformed, has wrong signature, or other JWT error
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -125,9 +276,9 @@ def register(hotel: schemas.HotelCreate, db: Session = Depends(database.get_db))
     
     How it works:
     1. Receives hotel registration data (name, email, password)
-    2. Checks if email is already registered (prevents duplicates)
-    3. Hashes the password for security (never store plain passwords!)
-    4. Creates new hotel record in database
+    2. Hashes the password for security (never store plain passwords!)
+    3. Creates new hotel record in database
+    4. Rejects duplicates via the unique index on email (no separate lookup)
     5. Returns success message
     
     Args:
@@ -150,27 +301,27 @@ def register(hotel: schemas.HotelCreate, db: Session = Depends(database.get_db))
     Response Example:
         {"message": "Hotel registered successfully"}
     """
-    # Check if a hotel with this email already exists
-    existing_hotel = db.query(models.Hotel).filter(models.Hotel.email == hotel.email).first()
-    if existing_hotel:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     # Hash the password using bcrypt (secure one-way encryption)
     # We NEVER store plain text passwords in the database
-    hashed_pw = bcrypt.hash(hotel.password)
+    hashed_pw = pwd_context.hash(hotel.password)
     
     # Create new hotel object with hashed password
     db_hotel = models.Hotel(name=hotel.name, email=hotel.email, password=hashed_pw)
     
     # Add to database and save changes
+    # The unique index on hotels.email rejects duplicates in the same round trip,
+    # which is also safe when two registrations for one email race each other
     db.add(db_hotel)       # Stage the new hotel for insertion
-    db.commit()            # Save to database
-    db.refresh(db_hotel)   # Refresh to get auto-generated ID
+    try:
+        db.commit()        # Save to database
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     return {"message": "Hotel registered successfully"}
 
 @router.post("/login")
-def login(hotel: schemas.HotelLogin, db: Session = Depends(database.get_db)):
+async def login(hotel: schemas.HotelLogin, db: Session = Depends(database.get_db)):
     """
     Hotel Login Endpoint
     
@@ -212,13 +363,24 @@ def login(hotel: schemas.HotelLogin, db: Session = Depends(database.get_db)):
         Include in future requests as: "Authorization: Bearer <access_token>"
     """
     # Find hotel by email address
-    db_hotel = db.query(models.Hotel).filter(models.Hotel.email == hotel.email).first()
+    # The query (like the commit below) runs in the threadpool: this endpoint
+    # is async, and blocking database calls must not stall the event loop
+    db_hotel = await run_in_threadpool(_find_by_email, db, models.Hotel, hotel.email)
     
     # Check if hotel exists and password is correct
-    # bcrypt.verify() compares plain password with hashed password
-    if not db_hotel or not bcrypt.verify(hotel.password, db_hotel.password):
+    # pwd_context.verify() compares plain password with hashed password
+    # It runs on the bcrypt pool so the event loop stays free meanwhile
+    # Unknown emails are checked against a dummy hash so they cost the same time
+    stored_hash = db_hotel.password if db_hotel else _DUMMY_PASSWORD_HASH
+    password_ok = await _run_in_password_pool(pwd_context.verify, hotel.password, stored_hash)
+    if not db_hotel or not password_ok:
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
+    # Upgrade the stored hash if BCRYPT_ROUNDS changed since it was created
+    if pwd_context.needs_update(db_hotel.password):
+        db_hotel.password = await _run_in_password_pool(pwd_context.hash, hotel.password)
+        await run_in_threadpool(db.commit)
+    
     # Create JWT token containing hotel identification information
     # This token will be sent with future requests to prove identity
     access_token = create_access_token(
@@ -238,66 +400,90 @@ def login(hotel: schemas.HotelLogin, db: Session = Depends(database.get_db)):
 # TRAVEL AGENT AUTHENTICATION FUNCTIONS
 # =============================================================================
 
-def get_current_travel_agent(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(database.get_db)
-):
+def get_current_agent_claims(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> AgentClaims:
     """
-    Middleware function to get currently authenticated travel agent.
+    Authentication dependency that identifies the current travel agent from the JWT alone.
     
-    Purpose: This function is used as a dependency in protected routes.
-    It verifies the JWT token and returns the travel agent information.
+    Purpose: This is the dependency used by protected travel agent routes.
+    The agent's id and name were put into the token at login and the token's
+    signature guarantees they weren't tampered with, so no database lookup
+    is needed to know who is calling.
     
     Process:
     1. Extract token from Authorization header
-    2. Decode and verify the JWT token
-    3. Extract travel agent information from token
-    4. Fetch travel agent details from database
-    5. Return travel agent object or raise error if invalid
+    2. Decode and verify the JWT token (signature, expiry, required claims)
+    3. Return the travel agent's id and name from the token
     
     Args:
         credentials: HTTP Authorization header containing JWT token
-        db: Database session for querying travel agent information
     
     Returns:
-        models.TravelAgent: The authenticated travel agent object
+        AgentClaims: id and name of the authenticated travel agent
     
     Raises:
-        HTTPException: If token is invalid, expired, or travel agent not found
+        HTTPException: 401 if token is invalid, expired, or not a travel agent token
     
     Usage in route:
         @router.get("/protected-endpoint")
-        def protected_route(current_agent: models.TravelAgent = Depends(get_current_travel_agent)):
+        def protected_route(current_agent: AgentClaims = Depends(get_current_agent_claims)):
             return {"agent_id": current_agent.id}
     """
+    # Extract the Bearer token from Authorization header
+    token = credentials.credentials
+    
+    # Fast path: this exact token was validated recently
+    cache_key = _TokenCache.key(token)
+    cached_agent = _agent_token_cache.get(cache_key)
+    if cached_agent is not None:
+        return cached_agent
+    
     try:
-        # Extract the Bearer token from Authorization header
-        token = credentials.credentials
-        
         # Decode the JWT token using secret key and algorithm
         # This verifies the token signature and extracts the payload
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        
-        # Extract travel agent information from token payload
-        agent_id: int = payload.get("agent_id")
-        if agent_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token: missing agent_id")
+        # PyJWT also checks that exp, agent_id and agent_name are present
+        payload = jwt.decode(
+            token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM],
+            options={"require": AGENT_TOKEN_REQUIRED_CLAIMS}
+        )
         
-        # Query database to get travel agent details
-        # This ensures the travel agent still exists and hasn't been deleted
-        db_agent = db.query(models.TravelAgent).filter(models.TravelAgent.id == agent_id).first()
-        if db_agent is None:
-            raise HTTPException(status_code=401, detail="Travel agent not found")
-        
-        return db_agent
+        current_agent = AgentClaims(id=payload["agent_id"], name=payload["agent_name"])
+        _agent_token_cache.put(cache_key, current_agent, payload["exp"])
+        return current_agent
         
     except jwt.ExpiredSignatureError:
         # Token has expired (older than 24 hours)
         raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
+    except jwt.MissingRequiredClaimError:
+        # Token is valid but was not issued to a travel agent (e.g. a hotel token)
+        raise HTTPException(status_code=401, detail="Invalid token: missing agent_id")
+    except jwt.InvalidTokenError:
         # Token is malformed or signature is invalid
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def get_current_travel_agent_db(
+    claims: AgentClaims = Depends(get_current_agent_claims),
+    db: Session = Depends(database.get_db)
+) -> models.TravelAgent:
+    """
+    Authentication dependency that also loads the travel agent's database row.
+    
+    Purpose: Only for routes that need columns the token doesn't carry
+    (e.g. company) or that must be sure the account still exists.
+    Everything else should use get_current_agent_claims and skip the SELECT.
+    
+    Returns:
+        models.TravelAgent: The authenticated travel agent object
+    
+    Raises:
+        HTTPException: 401 if the token is invalid or the travel agent no longer exists
+    """
+    db_agent = db.query(models.TravelAgent).filter(models.TravelAgent.id == claims.id).first()
+    if db_agent is None:
+        raise HTTPException(status_code=401, detail="Travel agent not found")
+    return db_agent
+
 @router.post("/register-agent")
 def register_travel_agent(agent: schemas.TravelAgentCreate, db: Session = Depends(database.get_db)):
     """
@@ -307,9 +493,9 @@ def register_travel_agent(agent: schemas.TravelAgentCreate, db: Session = Depend
     Travel agents can register to manage trips and calculate carbon footprints.
     
     Process:
-    1. Check if email already exists
-    2. Hash the password for security
-    3. Create new travel agent record in database
+    1. Hash the password for security
+    2. Create new travel agent record in database
+    3. Reject duplicates via the unique index on email
     4. Return confirmation message
     
     Args:
@@ -335,14 +521,9 @@ def register_travel_agent(agent: schemas.TravelAgentCreate, db: Session = Depend
             "agent_name": "Sarah Travel"
         }
     """
-    # Check if travel agent with this email already exists
-    existing_agent = db.query(models.TravelAgent).filter(models.TravelAgent.email == agent.email).first()
-    if existing_agent:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     # Hash the password before storing in database
     # bcrypt creates a secure hash that can't be reversed
-    hashed_password = bcrypt.hash(agent.password)
+    hashed_password = pwd_context.hash(agent.password)
     
     # Create new travel agent record
     db_agent = models.TravelAgent(
@@ -353,9 +534,15 @@ def register_travel_agent(agent: schemas.TravelAgentCreate, db: Session = Depend
     )
     
     # Add to database and commit changes
+    # Duplicate emails are rejected by the unique index on travel_agents.email
     db.add(db_agent)
-    db.commit()
-    db.refresh(db_agent)  # Refresh to get the assigned ID
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
+    # db_agent.id was assigned by the INSERT and stays loaded after commit
+    # (expire_on_commit=False), so no refresh query is needed
     
     return {
         "message": "Travel agent registered successfully",
@@ -364,7 +551,7 @@ def register_travel_agent(agent: schemas.TravelAgentCreate, db: Session = Depend
     }
 
 @router.post("/login-agent")
-def login_travel_agent(agent: schemas.TravelAgentLogin, db: Session = Depends(database.get_db)):
+async def login_travel_agent(agent: schemas.TravelAgentLogin, db: Session = Depends(database.get_db)):
     """
     Authenticate travel agent and return JWT token.
     
@@ -373,7 +560,7 @@ def login_travel_agent(agent: schemas.TravelAgentLogin, db: Session = Depends(da
     
     Process:
     1. Find travel agent by email
-    2. Verify password using bcrypt
+    2. Verify password using bcrypt (re-hashing it if the cost changed)
     3. Create JWT token with agent information
     4. Return token and agent details
     
@@ -404,12 +591,22 @@ def login_travel_agent(agent: schemas.TravelAgentLogin, db: Session = Depends(da
         Include in future requests as: "Authorization: Bearer <access_token>"
     """
     # Find travel agent by email address
-    db_agent = db.query(models.TravelAgent).filter(models.TravelAgent.email == agent.email).first()
+    # (in the threadpool, like the commit below - see login)
+    db_agent = await run_in_threadpool(_find_by_email, db, models.TravelAgent, agent.email)
     
     # Check if agent exists and password is correct
-    if not db_agent or not bcrypt.verify(agent.password, db_agent.password):
+    # Verification runs on the bcrypt pool so the event loop stays free meanwhile
+    # Unknown emails are checked against a dummy hash so they cost the same time
+    stored_hash = db_agent.password if db_agent else _DUMMY_PASSWORD_HASH
+    password_ok = await _run_in_password_pool(pwd_context.verify, agent.password, stored_hash)
+    if not db_agent or not password_ok:
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
+    # Upgrade the stored hash if BCRYPT_ROUNDS changed since it was created
+    if pwd_context.needs_update(db_agent.password):
+        db_agent.password = await _run_in_password_pool(pwd_context.hash, agent.password)
+        await run_in_threadpool(db.commit)
+    
     # Create JWT token containing agent identification information
     access_token = create_access_token(
         data={"agent_id": db_agent.id, "agent_name": db_agent.name}
@@ -0,0 +1,50 @@
+# =============================================================================
+# CLEANUP.PY - MAINTENANCE JOB FOR INCOMPLETE UPLOADS
+# =============================================================================
+# Bill uploads happen in two phases (see routes.upload_bill): a "pending" row
+# is written, the file is sent to S3, then the row is marked "ready". When an
+# upload fails or is interrupted in between, the pending row (and possibly its
+# S3 object) stays behind. This job removes them.
+#
+# How to run (from the project root, with the same .env as the API):
+#     python -m app.cleanup                    # pending rows older than 60 minutes
+#     python -m app.cleanup --older-than 120   # custom age, in minutes
+#
+# Schedule it periodically, e.g. an hourly cron entry:
+#     0 * * * * cd /srv/carbon-em-calc && python -m app.cleanup
+#
+# Uploads still in progress when their row passes the cutoff are told to
+# upload again (routes.mark_bill_ready finds no row), so keep the cutoff well
+# above the longest upload.
+# =============================================================================
+
+import argparse
+from datetime import timedelta
+from . import database, routes
+
+
+def main(argv=None) -> int:
+    """
+    Remove bills whose upload never completed, and report how many.
+
+    Args:
+        argv (list): Command-line arguments (defaults to sys.argv)
+
+    Returns:
+        int: Process exit code
+    """
+    parser = argparse.ArgumentParser(description="Remove stale pending bill uploads and their S3 files.")
+    parser.add_argument(
+        "--older-than", type=int, default=60, metavar="MINUTES",
+        help="Minimum age of the pending rows to remove (default: 60)"
+    )
+    args = parser.parse_args(argv)
+
+    with database.SessionLocal() as db:
+        removed = routes.cleanup_pending_bills(db, older_than=timedelta(minutes=args.older_than))
+    print(f"Removed {removed} pending bill(s) older than {args.older_than} minutes")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -21,22 +21,33 @@
 # =============================================================================
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from . import auth, routes, database
+import os
 
 # =============================================================================
 # DATABASE INITIALIZATION
 # =============================================================================
 # Create all database tables based on the models defined in models.py
-# This happens automatically when the application starts
 # If tables already exist, this does nothing (safe to run multiple times)
-database.Base.metadata.create_all(bind=database.engine)
+# 
+# This only runs when AUTO_CREATE_TABLES=1 (local development, tests).
+# Otherwise importing the app never touches the database, so every reload and
+# every `--workers N` process doesn't race to run DDL at boot, and tooling
+# such as OpenAPI export works without a database.
+# In production, create/alter tables at deploy time and leave the flag off.
+if os.getenv("AUTO_CREATE_TABLES") == "1":
+    database.Base.metadata.create_all(bind=database.engine)
 
 # =============================================================================
 # FASTAPI APPLICATION SETUP
 # =============================================================================
 # Create the main FastAPI application instance
 # This is the core object that handles all HTTP requests
+# Responses are encoded with orjson (C) by default instead of json.dumps;
+# endpoints can still return their own Response (class) where needed
 app = FastAPI(
+    default_response_class=ORJSONResponse,
     title="Carbon Emission Calculator API",
     description="API for hotels and travel agents to track and calculate carbon footprints",
     version="2.0.0",
@@ -15,7 +15,7 @@
 # - Protection against SQL injection attacks
 # =============================================================================
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text, Index, Numeric, Enum, CheckConstraint, text
 from sqlalchemy.orm import relationship
 from .database import Base  # Base class for all database models
 from datetime import datetime
@@ -41,7 +41,9 @@ class Hotel(Base):
     name = Column(String(255), nullable=False)
     
     # Email address - used for login (must be unique)
-    email = Column(String(255), unique=True, nullable=False)
+    # unique + index creates a unique B-tree index, so login lookups are a single
+    # index probe and duplicate registrations are rejected by the database
+    email = Column(String(255), unique=True, index=True, nullable=False)
     
     # Encrypted password - NEVER stored as plain text
     password = Column(String(255), nullable=False)
@@ -77,7 +79,9 @@ class TravelAgent(Base):
     name = Column(String(255), nullable=False)
     
     # Email address - used for login (must be unique)
-    email = Column(String(255), unique=True, nullable=False)
+    # unique + index creates a unique B-tree index, so login lookups are a single
+    # index probe and duplicate registrations are rejected by the database
+    email = Column(String(255), unique=True, index=True, nullable=False)
     
     # Encrypted password - NEVER stored as plain text
     password = Column(String(255), nullable=False)
@@ -112,7 +116,8 @@ class Trip(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     # Foreign key - links to the Travel Agent who created this trip
-    travel_agent_id = Column(Integer, ForeignKey("travel_agents.id"), nullable=False)
+    # Indexed: "my trips" looks trips up by agent
+    travel_agent_id = Column(Integer, ForeignKey("travel_agents.id"), nullable=False, index=True)
     
     # Trip identification and details
     trip_name = Column(String(255), nullable=False)  # e.g., "Europe Adventure Tour"
@@ -132,6 +137,13 @@ class Trip(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
+    # Trip components are loaded only when accessed (the default lazy loading):
+    # the trip endpoints read components with column queries of their own, so
+    # loading a Trip never costs extra queries for collections nobody uses.
+    # Code that does walk the collections of many trips should add
+    # .options(selectinload(Trip.flight_segments), ...) to its query - one
+    # extra "WHERE trip_id IN (...)" query per component type instead of one
+    # query per trip per component (the N+1 problem).
     travel_agent = relationship("TravelAgent", back_populates="trips")
     flight_segments = relationship("FlightSegment", back_populates="trip")
     local_transports = relationship("LocalTransport", back_populates="trip")
@@ -152,7 +164,8 @@ class FlightSegment(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     # Foreign key - links to the Trip this flight belongs to
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False)
+    # Indexed: trip components are loaded with "WHERE trip_id IN (...)"
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
     
     # Airport codes (e.g., "LAX", "JFK", "LHR")
     departure_airport = Column(String(10), nullable=False)
@@ -183,9 +196,12 @@ class LocalTransport(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     # Foreign key - links to the Trip this transport belongs to
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False)
+    # Indexed: trip components are loaded with "WHERE trip_id IN (...)"
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
     
     # Transportation details
+    # Free text rather than an enum: any spelling/case is accepted and unknown
+    # types are costed like a car (see calculate_transport_carbon)
     vehicle_type = Column(String(50), nullable=False)  # "bus", "car", "train", "taxi"
     distance_km = Column(Float, nullable=False)        # Distance traveled
     
@@ -210,10 +226,11 @@ class HotelStay(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     # Foreign key - links to the Trip this stay belongs to
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False)
+    # Indexed: trip components are loaded with "WHERE trip_id IN (...)"
+    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
     
     # Foreign key - links to the Hotel where tourists stayed
-    hotel_id = Column(Integer, ForeignKey("hotels.id"), nullable=False)
+    hotel_id = Column(Integer, ForeignKey("hotels.id"), nullable=False, index=True)
     
     # Stay details
     number_of_nights = Column(Integer, nullable=False)
@@ -227,6 +244,10 @@ class HotelStay(Base):
     trip = relationship("Trip", back_populates="hotel_stays")
     hotel = relationship("Hotel")
 
+# Upload states of a utility bill (see UtilityBill.status)
+BILL_STATUS_PENDING = "pending"  # Row written, file upload to S3 not finished
+BILL_STATUS_READY = "ready"      # File stored in S3; bill is visible everywhere
+
 class UtilityBill(Base):
     """
     Utility Bill Model - Represents uploaded utility bills
@@ -246,6 +267,38 @@ class UtilityBill(Base):
     """
     __tablename__ = "utility_bills"  # Actual table name in database
 
+    # Composite index for the bill lookups: every query filters by hotel, and
+    # the carbon calculations also narrow by year/month and group by
+    # (year, month, type) - all covered by the index key. The leading hotel_id
+    # column makes "all bills of a hotel" an index range scan as well.
+    # On PostgreSQL the index is also:
+    # - partial: only ready bills are indexed, the only ones any read query
+    #   looks at (pending rows are found via the status index)
+    # - covering: bill_amount and id are stored in the index (INCLUDE), so the
+    #   carbon sums and the newest-bill lookup are index-only scans that never
+    #   read the table rows
+    # Existing databases replace the earlier index with:
+    #   DROP INDEX ix_utility_bills_hotel_year_month_type;
+    #   CREATE INDEX ix_utility_bills_ready_hotel_year_month_type
+    #       ON utility_bills (hotel_id, bill_year, bill_month, bill_type)
+    #       INCLUDE (bill_amount, id) WHERE status = 'ready';
+    # Check with EXPLAIN (ANALYZE, BUFFERS) that the carbon queries show an
+    # "Index Only Scan" (after VACUUM has updated the visibility map).
+    # The month check lets PostgreSQL enforce (and the planner rely on) the same
+    # 1-12 range the upload form already validates.
+    # Existing databases add it with:
+    #   ALTER TABLE utility_bills
+    #       ADD CONSTRAINT ck_utility_bills_month CHECK (bill_month BETWEEN 1 AND 12);
+    __table_args__ = (
+        Index(
+            "ix_utility_bills_ready_hotel_year_month_type",
+            "hotel_id", "bill_year", "bill_month", "bill_type",
+            postgresql_include=["bill_amount", "id"],
+            postgresql_where=text(f"status = '{BILL_STATUS_READY}'"),
+        ),
+        CheckConstraint("bill_month BETWEEN 1 AND 12", name="ck_utility_bills_month"),
+    )
+
     # Primary key - unique identifier for each bill
     id = Column(Integer, primary_key=True, index=True)
     
@@ -253,13 +306,22 @@ class UtilityBill(Base):
     # This creates the relationship between hotels and their bills
     hotel_id = Column(Integer, ForeignKey("hotels.id"), nullable=False)
     
-    # Hotel name (stored for convenience/reporting)
-    # Note: This is denormalized data (stored in both hotels and utility_bills tables)
-    # It makes queries faster but requires careful updating if hotel name changes
-    hotel_name = Column(String(255), nullable=False)
-    
-    # Type of utility bill: "electricity", "water", etc.
-    bill_type = Column(String(50), nullable=False)
+    # Note: The hotel name is NOT copied onto each bill; code that needs it
+    # reads it from hotels by hotel_id (a primary key lookup - the bill
+    # listing does so once per list). This keeps bill rows narrow and a hotel
+    # rename touches a single row.
+    # Existing databases drop the old denormalized column with:
+    #   ALTER TABLE utility_bills DROP COLUMN hotel_name;
+    
+    # Type of utility bill: "electricity" or "water"
+    # A native PostgreSQL enum: 4 bytes per row instead of a variable-length
+    # string, and the database rejects unknown types.
+    # Existing databases (previously VARCHAR(50)) are converted with:
+    #   CREATE TYPE bill_type_enum AS ENUM ('electricity', 'water');
+    #   ALTER TABLE utility_bills
+    #       ALTER COLUMN bill_type TYPE bill_type_enum USING bill_type::bill_type_enum;
+    # Adding a bill type later needs: ALTER TYPE bill_type_enum ADD VALUE '...';
+    bill_type = Column(Enum("electricity", "water", name="bill_type_enum"), nullable=False)
     
     # Month the bill is for (1-12 for Jan-Dec)
     bill_month = Column(Integer, nullable=False)
@@ -271,18 +333,35 @@ class UtilityBill(Base):
     # For electricity: kWh (kilowatt-hours)
     # For water: liters or gallons
     # This is the key value used for carbon footprint calculations
-    bill_amount = Column(String(20), nullable=False)
+    # Stored as a number (up to 999,999,999.999) so reads come back already
+    # parsed and amounts can be compared/summed in SQL.
+    # Existing databases (previously VARCHAR(20)) are converted with:
+    #   ALTER TABLE utility_bills
+    #       ALTER COLUMN bill_amount TYPE numeric(12,3) USING bill_amount::numeric;
+    bill_amount = Column(Numeric(12, 3), nullable=False)
     
     # Unit of measurement for the bill amount
     # Examples: "kWh", "liters", "gallons", "cubic meters"
+    # Kept as free text: several spellings are accepted per bill type and the
+    # unit is stored as the hotel entered it
     unit = Column(String(20), nullable=False)
     
     # AWS S3 URL where the actual bill file is stored
-    # Example: "https://my-bucket.s3.amazonaws.com/123_electricity_2024_3_1234567890_bill.pdf"
+    # Example: "https://my-bucket.s3.ap-south-1.amazonaws.com/123/electricity/2024/03/1710234567890123456_9f1c2a7b_bill.pdf"
     file_url = Column(String(500), nullable=False)
     
     # When this bill record was uploaded to the system
     uploaded_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Upload state: "pending" while the file is being sent to S3, "ready" after
+    # The row is written before the upload, so a failed upload leaves a pending
+    # row (found through this index) instead of an untracked S3 object.
+    # Listings and calculations only use ready bills.
+    # Existing databases add it with (existing bills count as ready):
+    #   ALTER TABLE utility_bills ADD COLUMN status VARCHAR(16) NOT NULL DEFAULT 'ready';
+    #   ALTER TABLE utility_bills ALTER COLUMN status DROP DEFAULT;
+    #   CREATE INDEX ix_utility_bills_status ON utility_bills (status);
+    status = Column(String(16), nullable=False, default=BILL_STATUS_PENDING, index=True)
 
     # Relationship: Links back to the Hotel that owns this bill
     # 'back_populates' creates a two-way relationship
@@ -321,7 +400,8 @@ class UtilityBill(Base):
 # agent = db.query(TravelAgent).filter(TravelAgent.id == 123).first()
 # all_trips = agent.trips  # List of Trip objects
 # 
-# # Get all components of a trip:
+# # Get all components of a trip (each collection is loaded from the database
+# # the first time it is accessed, see Trip):
 # trip = db.query(Trip).filter(Trip.id == 456).first()
 # flights = trip.flight_segments      # List of FlightSegment objects
 # transports = trip.local_transports  # List of LocalTransport objects
@@ -334,4 +414,17 @@ class UtilityBill(Base):
 #     sum(stay.carbon_kg_total for stay in hotels)
 # )
 # 
+# # When walking the components of many trips, load them up front instead
+# # (one query per component type rather than one per trip):
+# trips = (
+#     db.query(Trip)
+#     .filter(Trip.travel_agent_id == 123)
+#     .options(
+#         selectinload(Trip.flight_segments),
+#         selectinload(Trip.local_transports),
+#         selectinload(Trip.hotel_stays),
+#     )
+#     .all()
+# )
+# 
 # =============================================================================
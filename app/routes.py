@@ -15,14 +15,31 @@
 # - Database storage of bills and trip metadata
 # =============================================================================
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import Float, bindparam, case, cast, delete, func, insert, select, update
 from sqlalchemy.orm import Session
 from . import database, models, schemas
-from .auth import get_current_hotel, get_current_travel_agent  # Import authentication dependencies
+from .auth import get_current_hotel, get_current_agent_claims, HotelClaims, AgentClaims  # Import authentication dependencies
 import boto3  # Amazon Web Services SDK for S3 uploads
+from boto3.s3.transfer import TransferConfig
+from boto3.exceptions import S3UploadFailedError
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+import math
+import orjson
 import os
-from datetime import datetime
-from typing import List
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from itertools import combinations_with_replacement
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import PurePosixPath
+from types import MappingProxyType
+from typing import List, Optional
 
 # Create FastAPI router for bill-related endpoints
 # All routes in this module will be prefixed with "/bills"
@@ -36,28 +53,279 @@ router = APIRouter(prefix="/bills", tags=["Bills"])
 
 # Get S3 configuration from environment variables
 S3_BUCKET = os.getenv("S3_BUCKET", "your-s3-bucket-name")
+AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
+
+# Public URL prefix of uploaded files, built once
+# Uses the regional virtual-hosted-style endpoint: the global
+# "<bucket>.s3.amazonaws.com" host redirects requests for buckets outside
+# us-east-1, adding a round trip to every download.
+# Point this at a CDN / Transfer Acceleration host to change all new URLs.
+S3_URL_PREFIX = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/"
+
+# Connection settings for the S3 client
+# max_pool_connections: Keep-alive HTTP connections shared by concurrent uploads
+#                       (and by the parts of one multipart upload)
+# tcp_keepalive: Keep idle pooled connections alive instead of reconnecting
+# retries: Adaptive retry mode backs off client-side when S3 throttles
+S3_CLIENT_CONFIG = BotoConfig(
+    max_pool_connections=32,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive"}
+)
 
 # Create S3 client with credentials
+# Created once at import; every request reuses its connection pool
 s3 = boto3.client(
     "s3",
     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
     aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION", "ap-south-1")
+    region_name=AWS_REGION,
+    config=S3_CLIENT_CONFIG
+)
+
+# Upload tuning, built once and shared by all uploads
+# Files above 8 MB are sent as a multipart upload with up to 8 parts in flight;
+# smaller files go up in a single PUT.
+# Uploaded files are never read into memory as a whole: Starlette spools each
+# upload to a temporary file once it exceeds 1 MB, and boto3 streams from that
+# file in 1 MB reads (io_chunksize), so memory per upload stays bounded
+# regardless of the file size.
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    io_chunksize=1024 * 1024,
+    use_threads=True
 )
 
+# =============================================================================
+# EMISSION FACTORS
+# =============================================================================
+# Defined once at import and shared by every calculation. The mappings are
+# read-only views (MappingProxyType) so no request can modify them.
+
+# Hotel carbon footprint (kg CO2 per unit of the bill)
+BILL_EMISSION_FACTORS = MappingProxyType({
+    "electricity": 0.5,    # kg CO2 per kWh (varies by region)
+    "water": 0.001         # kg CO2 per liter (includes treatment)
+})
+
+# Hotel stay estimates from the hotel's bills (kg CO2 per unit of the bill)
+# Both factor tables cover exactly the bill types the database accepts (the
+# bill_type_enum); a new bill type needs its factors added here, to the enum,
+# to the upload form and to VALID_UNITS together
+HOTEL_STAY_EMISSION_FACTORS = MappingProxyType({
+    "electricity": 0.708,
+    "water": 0.298
+})
+
+# Local transport (kg CO2 per passenger-km)
+TRANSPORT_EMISSION_FACTORS = MappingProxyType({
+    "bus": 0.089,
+    "car": 0.171,
+    "train": 0.041,
+    "taxi": 0.171,
+    "metro": 0.033
+})
+TRANSPORT_DEFAULT_FACTOR = 0.171  # Unknown vehicles count as a car
+
+# Aviation: approximately 0.255 kg CO2 per passenger-km
+FLIGHT_EMISSION_FACTOR = 0.255
+
+# =============================================================================
+# SQL HELPERS
+# =============================================================================
+
+def summed_as_float(column):
+    """
+    SUM of a numeric column/expression, as a float that is never NULL.
+    
+    The database does the conversion for the whole (aggregated) result:
+    the driver hands back plain floats instead of building a Decimal per
+    value that Python code would then convert, and an empty sum is 0.
+    """
+    return cast(func.coalesce(func.sum(column), 0), Float)
+
+# =============================================================================
+# PREBUILT SQL STATEMENTS
+# =============================================================================
+# The hot bill statements are built once here, with bind parameters for the
+# per-request values. Reusing the same statement objects lets SQLAlchemy's
+# compiled-statement cache skip rebuilding and recompiling the SQL per request.
+
+# All bills of one hotel, as plain rows with only the response columns:
+# no ORM objects, identity map or attribute tracking for a read-only listing
+# The hotel name is not repeated per bill (and hotels is not joined): the
+# listing carries it once, from HOTEL_NAME_STMT
+MY_BILLS_STMT = select(
+    models.UtilityBill.id,
+    models.UtilityBill.bill_type,
+    models.UtilityBill.bill_month,
+    models.UtilityBill.bill_year,
+    models.UtilityBill.bill_amount,
+    models.UtilityBill.unit,
+    models.UtilityBill.hotel_id,
+    models.UtilityBill.file_url,
+    models.UtilityBill.uploaded_at
+).where(
+    models.UtilityBill.hotel_id == bindparam("hotel_id"),
+    # Only bills whose file upload completed
+    models.UtilityBill.status == models.BILL_STATUS_READY
+)
+
+# Current name of one hotel (a primary key lookup)
+# Read from the database rather than the token, whose copy of the name is only
+# as fresh as the login it came from
+HOTEL_NAME_STMT = select(models.Hotel.name).where(models.Hotel.id == bindparam("hotel_id"))
+
+# orjson options for documents whose datetimes are naive UTC (the timestamps
+# set with datetime.utcnow): they are written with a "Z" suffix, e.g.
+# "2024-03-15T10:30:00Z", so clients don't have to guess the timezone
+UTC_DATETIME_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+def format_bill_amount(amount: Decimal) -> str:
+    """
+    Text of a bill amount as sent to clients: plain decimal notation without
+    trailing zeros, e.g. "1450.75", "2500" or "0".
+    
+    NUMERIC(12, 3) values come back padded to three decimals ("1450.750"),
+    and str(Decimal) may use exponent notation ("1E+3"); this gives the same
+    text for the same amount everywhere.
+    """
+    return format(amount.normalize(), "f")
+
+def serialize_bill_rows(hotel_name: str, result) -> bytes:
+    """
+    Encode a MY_BILLS_STMT result as the {"hotel_name": ..., "bills": [...]}
+    JSON document.
+    
+    How it works: The column names are taken once from the result, and each
+    row (a plain tuple) is zipped with them into the dict orjson encodes,
+    with only the (Decimal) amount turned into text by format_bill_amount -
+    no ORM objects, schema models or per-row mapping objects are built, and
+    orjson writes the whole document in one C call, formatting uploaded_at
+    (UTC) in C as well.
+    
+    Args:
+        hotel_name (str): Name of the hotel the bills belong to
+        result: Result of executing MY_BILLS_STMT
+    
+    Returns:
+        bytes: The UTF-8 JSON response body
+    """
+    columns = tuple(result.keys())
+    bills = []
+    for row in result:
+        bill = dict(zip(columns, row))
+        bill["bill_amount"] = format_bill_amount(bill["bill_amount"])
+        bills.append(bill)
+    return orjson.dumps(
+        {"hotel_name": hotel_name, "bills": bills},
+        option=UTC_DATETIME_OPTIONS
+    )
+
+# Single-row bill insert that hands back the generated id (INSERT ... RETURNING)
+# Column values are supplied as parameters at execution time
+INSERT_BILL_STMT = insert(models.UtilityBill).returning(models.UtilityBill.id)
+
+# Flips a pending bill to ready once its file is in S3
+MARK_BILL_READY_STMT = update(models.UtilityBill).where(
+    models.UtilityBill.id == bindparam("bill_id")
+).values(status=models.BILL_STATUS_READY)
+
+# Single-row trip insert returning the new trip id, used by trip creation
+INSERT_TRIP_STMT = insert(models.Trip).returning(models.Trip.id)
+
+
+def save_bill_record(db: Session, values: dict) -> int:
+    """
+    Insert one utility bill row and commit it.
+    
+    Purpose: Blocking part of the upload's database work, kept in a plain
+    function so the async upload endpoint can run it in the threadpool.
+    
+    Args:
+        db (Session): Database session of the current request
+        values (dict): Column values for the new utility_bills row
+    
+    Returns:
+        int: ID of the inserted bill
+    """
+    # A single INSERT ... RETURNING id - no ORM object or refresh query needed
+    bill_id = db.execute(INSERT_BILL_STMT, values).scalar_one()
+    db.commit()
+    return bill_id
+
+def mark_bill_ready(db: Session, bill_id: int) -> bool:
+    """
+    Mark an uploaded bill as ready and commit.
+    
+    Purpose: Second phase of an upload, run (in the threadpool) once the
+    bill's file is stored in S3. From then on the bill shows up in listings
+    and carbon calculations.
+    
+    Args:
+        db (Session): Database session of the current request
+        bill_id (int): ID of the pending bill
+    
+    Returns:
+        bool: False if the pending row no longer exists (an upload that took
+              longer than the cleanup_pending_bills cutoff), True otherwise
+    """
+    updated = db.execute(MARK_BILL_READY_STMT, {"bill_id": bill_id}).rowcount
+    db.commit()
+    return updated == 1
+
+def cleanup_pending_bills(db: Session, older_than: timedelta = timedelta(hours=1)) -> int:
+    """
+    Remove bills whose upload never completed.
+    
+    Purpose: Uploads write a "pending" row before sending the file to S3 and
+    mark it "ready" afterwards. Rows still pending after `older_than` belong
+    to failed or interrupted uploads; this deletes them together with any
+    object that did reach S3, so the bucket never keeps files without a row.
+    
+    How to run: Periodically from a maintenance job (cron, a scheduled
+    container, ...) with `python -m app.cleanup` - see app/cleanup.py
+    
+    Args:
+        db (Session): Database session
+        older_than (timedelta): Minimum age of the pending rows to remove
+    
+    Returns:
+        int: Number of bills removed
+    """
+    cutoff = datetime.utcnow() - older_than
+    # Indexed on status; only the (few) stale pending rows are touched
+    stale = db.execute(
+        delete(models.UtilityBill)
+        .where(
+            models.UtilityBill.status == models.BILL_STATUS_PENDING,
+            models.UtilityBill.uploaded_at < cutoff
+        )
+        .returning(models.UtilityBill.file_url)
+    ).scalars().all()
+    
+    # Delete the matching objects (missing ones are ignored by S3), up to
+    # 1000 keys per request, before committing the row deletion
+    keys = [url[len(S3_URL_PREFIX):] for url in stale if url.startswith(S3_URL_PREFIX)]
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(
+            Bucket=S3_BUCKET,
+            Delete={"Objects": [{"Key": key} for key in keys[i:i + 1000]], "Quiet": True}
+        )
+    db.commit()
+    return len(stale)
+
 # =============================================================================
 # BILL UPLOAD ENDPOINT
 # =============================================================================
 
 @router.post("/upload", response_model=schemas.BillUploadResponse)
 async def upload_bill(
-    bill_type: str = Form(...),        # electricity, water, etc.
-    bill_month: int = Form(...),       # 1-12
-    bill_year: int = Form(...),        # 2023, 2024...
-    bill_amount: str = Form(...),      # Consumption amount from the bill
-    unit: str = Form(...),             # Unit of measurement (kWh, liters, etc.)
+    form: schemas.BillUploadForm = Depends(schemas.BillUploadForm.as_form),  # Validated bill form fields
     file: UploadFile = File(...),      # The actual bill file (PDF, image, etc.)
-    current_hotel: dict = Depends(get_current_hotel),  # Authenticated hotel info
+    current_hotel: HotelClaims = Depends(get_current_hotel),  # Authenticated hotel info
     db: Session = Depends(database.get_db),            # Database session
 ):
     """
@@ -81,20 +349,22 @@ async def upload_bill(
     - Only authenticated hotel can upload bills for themselves
     
     Args:
-        bill_type (str): Type of utility bill ("electricity" or "water")
-        bill_month (int): Month the bill is for (1-12)
-        bill_year (int): Year the bill is for
-        bill_amount (str): Exact consumption amount from the bill (e.g., "1450.75")
-        unit (str): Unit of measurement (e.g., "kWh", "liters", "gallons")
+        form (BillUploadForm): Validated form fields (auto-injected):
+            bill_type: Type of utility bill ("electricity" or "water")
+            bill_month: Month the bill is for (1-12)
+            bill_year: Year the bill is for
+            bill_amount: Exact consumption amount from the bill (e.g., "1450.75")
+            unit: Unit of measurement (e.g., "kWh", "liters", "gallons")
         file (UploadFile): The bill file to upload
-        current_hotel (dict): Hotel info from JWT token (auto-injected)
+        current_hotel (HotelClaims): Hotel info from JWT token (auto-injected)
         db (Session): Database session (auto-injected)
     
     Returns:
         BillUploadResponse: Contains bill ID, metadata, consumption data, and file URL
     
     Raises:
-        HTTPException: 400 for invalid data, 401 for authentication errors, 500 for upload errors
+        HTTPException: 401 for authentication errors, 500 for upload errors
+        RequestValidationError: 422 for invalid form data
     
     Request Example (multipart/form-data):
         POST /bills/upload
@@ -115,142 +385,138 @@ async def upload_bill(
             "bill_year": 2024,
             "bill_amount": "1450.75",
             "unit": "kWh",
-            "file_url": "https://bucket.s3.amazonaws.com/456_electricity_2024_3_1234567890_bill.pdf",
+            "file_url": "https://bucket.s3.ap-south-1.amazonaws.com/456/electricity/2024/03/1710234567890123456_9f1c2a7b_bill.pdf",
             "message": "Bill uploaded successfully"
         }
     """
+    # =============================================================================
+    # INPUT VALIDATION
+    # =============================================================================
+
+    # Form fields were already parsed and validated in one pass by the
+    # BillUploadForm dependency (invalid data never reaches this point)
+    bill_type = form.bill_type
+    bill_month = form.bill_month
+    bill_year = form.bill_year
+    bill_amount = form.bill_amount
+    unit = form.unit
+
+    # =============================================================================
+    # HOTEL IDENTIFICATION
+    # =============================================================================
+
+    # Extract hotel information from validated JWT token
+    # This ensures the bill is associated with the correct hotel
+    hotel_id = current_hotel.hotel_id
+
+    # =============================================================================
+    # S3 KEY GENERATION
+    # =============================================================================
+
+    # Generate unique S3 key with hotel identification
+    # Format: {hotel_id}/{bill_type}/{year}/{month}/{nanoseconds}_{random}_{original_filename}
+    # Example: 456/electricity/2024/03/1710234567890123456_9f1c2a7b_march_bill.pdf
+    # - The "/" separated prefix groups each hotel's bills, so they can be
+    #   listed per hotel/type/period
+    # - Integer nanoseconds plus a random token keep concurrent uploads of
+    #   the same file from colliding
+    # - Only the last path component of the client-supplied name is kept,
+    #   so names like "../../x.pdf" can't inject extra key segments
+    original_name = PurePosixPath(file.filename or "bill").name or "bill"
+    filename = (
+        f"{hotel_id}/{bill_type}/{bill_year:04d}/{bill_month:02d}/"
+        f"{time.time_ns()}_{secrets.token_hex(4)}_{original_name}"
+    )
+
+    # Public URL the file will have once uploaded
+    file_url = S3_URL_PREFIX + filename
+
+    # =============================================================================
+    # DATABASE STORAGE (PHASE 1: PENDING RECORD)
+    # =============================================================================
+    
+    # Insert new UtilityBill record with all metadata AND consumption data
+    # The row is written BEFORE the upload with status "pending", so an object
+    # can never end up in S3 without a database row pointing at it: if the
+    # upload (or anything after it) fails, the row stays pending and
+    # cleanup_pending_bills() later removes both the row and any object.
+    # The INSERT and COMMIT are blocking database calls, so they run in the
+    # threadpool instead of on the event loop
+    bill_id = await run_in_threadpool(save_bill_record, db, {
+        "hotel_id": hotel_id,          # Link to hotel that uploaded
+        "bill_type": bill_type,        # electricity, water, etc.
+        "bill_month": bill_month,      # 1-12
+        "bill_year": bill_year,        # 2023, 2024, etc.
+        "bill_amount": bill_amount,    # ⚡ Consumption amount (parsed Decimal) for carbon calculations
+        "unit": unit,                  # 📊 Unit of measurement
+        "file_url": file_url,          # S3 URL where file will be stored
+        "status": models.BILL_STATUS_PENDING
+        # uploaded_at is automatically set by SQLAlchemy
+    })
+
+    # =============================================================================
+    # FILE UPLOAD TO S3
+    # =============================================================================
+    
+    # Upload file to AWS S3 bucket
+    # file.file is the actual file content as a file-like object
+    # boto3 is blocking, so the upload runs in a worker thread to keep the
+    # event loop serving other requests while the file is transferred.
+    # The spooled file is handed over as-is (no copy into memory): it is
+    # only touched by that one thread until the upload returns.
     try:
-        # =============================================================================
-        # INPUT VALIDATION
-        # =============================================================================
-        
-        # Validate bill type - only electricity and water are currently supported
-        if bill_type not in ["electricity", "water"]:
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid bill type. Must be 'electricity' or 'water'"
-            )
-        
-        # Validate month - must be 1-12 (January-December)
-        if not (1 <= bill_month <= 12):
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid month. Must be between 1 and 12"
-            )
-        
-        # Validate year - reasonable range to prevent errors
-        current_year = datetime.now().year
-        if bill_year < 2020 or bill_year > current_year + 1:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid year. Must be between 2020 and {current_year + 1}"
-            )
-
-        # Validate bill amount - must be a valid number
-        try:
-            float_amount = float(bill_amount)
-            if float_amount < 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Bill amount must be a positive number"
-                )
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail="Bill amount must be a valid number (e.g., '450' or '1250.75')"
-            )
-
-        # Validate unit - must be appropriate for the bill type
-        valid_units = {
-            "electricity": ["kWh", "kw", "kwh", "kilowatt-hours", "units"],
-            "water": ["liters", "litres", "gallons", "cubic meters", "m3", "l", "gal"]
-        }
-        
-        if unit.lower() not in [u.lower() for u in valid_units.get(bill_type, [])]:
-            valid_units_str = ", ".join(valid_units.get(bill_type, []))
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid unit for {bill_type}. Valid units: {valid_units_str}"
-            )
-
-        # =============================================================================
-        # HOTEL IDENTIFICATION
-        # =============================================================================
-        
-        # Extract hotel information from validated JWT token
-        # This ensures the bill is associated with the correct hotel
-        hotel_id = current_hotel["hotel_id"]
-        hotel_name = current_hotel["hotel_name"]
-
-        # =============================================================================
-        # FILE UPLOAD TO S3
-        # =============================================================================
-        
-        # Generate unique filename with hotel identification
-        # Format: {hotel_id}_{bill_type}_{year}_{month}_{timestamp}_{original_filename}
-        # Example: 456_electricity_2024_3_1710234567.89_march_bill.pdf
-        timestamp = datetime.now().timestamp()
-        filename = f"{hotel_id}_{bill_type}_{bill_year}_{bill_month}_{timestamp}_{file.filename}"
-
-        # Upload file to AWS S3 bucket
-        # file.file is the actual file content as a file-like object
-        s3.upload_fileobj(file.file, S3_BUCKET, filename)
-
-        # Generate the public URL for the uploaded file
-        file_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{filename}"
-
-        # =============================================================================
-        # DATABASE STORAGE
-        # =============================================================================
-        
-        # Create new UtilityBill record with all metadata AND consumption data
-        db_bill = models.UtilityBill(
-            hotel_id=hotel_id,          # Link to hotel that uploaded
-            hotel_name=hotel_name,      # Hotel name for convenience
-            bill_type=bill_type,        # electricity, water, etc.
-            bill_month=bill_month,      # 1-12
-            bill_year=bill_year,        # 2023, 2024, etc.
-            bill_amount=bill_amount,    # ⚡ Consumption amount for carbon calculations
-            unit=unit,                  # 📊 Unit of measurement
-            file_url=file_url           # S3 URL where file is stored
-            # uploaded_at is automatically set by SQLAlchemy
-        )
-        
-        # Save to database
-        db.add(db_bill)         # Stage for insertion
-        db.commit()             # Save to database
-        db.refresh(db_bill)     # Refresh to get auto-generated ID
-
-        # =============================================================================
-        # SUCCESS RESPONSE
-        # =============================================================================
-        
-        # Return success response with bill information including consumption data
-        return schemas.BillUploadResponse(
-            id=db_bill.id,
-            bill_type=db_bill.bill_type,
-            bill_month=db_bill.bill_month,
-            bill_year=db_bill.bill_year,
-            bill_amount=db_bill.bill_amount,    # ⚡ Consumption amount
-            unit=db_bill.unit,                  # 📊 Unit of measurement
-            file_url=db_bill.file_url,
-            message="Bill uploaded successfully"
+        await run_in_threadpool(
+            s3.upload_fileobj, file.file, S3_BUCKET, filename, Config=S3_TRANSFER_CONFIG
         )
-
-    except HTTPException:
-        # Re-raise HTTP exceptions (validation errors)
-        raise
-    except Exception as e:
-        # Catch any other errors (S3 upload failures, database errors, etc.)
+    except (BotoCoreError, ClientError, S3UploadFailedError) as e:
+        # Only storage errors are turned into an upload failure response;
+        # the pending row is left for cleanup_pending_bills()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+    # =============================================================================
+    # DATABASE STORAGE (PHASE 2: MARK READY)
+    # =============================================================================
+    
+    # The file is in S3, so the bill becomes visible to listings and
+    # carbon calculations
+    if not await run_in_threadpool(mark_bill_ready, db, bill_id):
+        # The pending row was removed by cleanup_pending_bills while the file
+        # was uploading: drop the object too, so it isn't left without a row
+        await run_in_threadpool(s3.delete_object, Bucket=S3_BUCKET, Key=filename)
+        raise HTTPException(status_code=500, detail="Upload failed: the bill record expired, please upload again")
+    # The hotel's cached average daily emissions no longer include all its bills
+    _avg_daily_emissions_cache.invalidate(current_hotel.hotel_id)
+
+    # =============================================================================
+    # SUCCESS RESPONSE
+    # =============================================================================
+
+    # Return success response with bill information including consumption data
+    # The response dataclass is encoded by orjson in one step and returned as
+    # an ORJSONResponse, so FastAPI skips its own validate + jsonable_encoder
+    # + encode pass over it
+    return ORJSONResponse(schemas.BillUploadResponse(
+        id=bill_id,
+        bill_type=bill_type,
+        bill_month=bill_month,
+        bill_year=bill_year,
+        bill_amount=format_bill_amount(bill_amount),  # ⚡ Consumption amount, formatted like the listing
+        unit=unit,                  # 📊 Unit of measurement
+        file_url=file_url,
+        message="Bill uploaded successfully"
+    ))
+
 # =============================================================================
 # BILL RETRIEVAL ENDPOINT
 # =============================================================================
 
-@router.get("/my-bills")
-async def get_my_bills(
-    current_hotel: dict = Depends(get_current_hotel),  # Authenticated hotel info
+# Plain "def": the query blocks, so FastAPI runs it in the threadpool
+# response_model only documents the response: the endpoint returns the JSON
+# body (encoded by orjson) itself, so FastAPI neither validates nor re-encodes
+# the rows
+@router.get("/my-bills", response_model=schemas.BillList, response_class=ORJSONResponse)
+def get_my_bills(
+    current_hotel: HotelClaims = Depends(get_current_hotel),  # Authenticated hotel info
     db: Session = Depends(database.get_db)             # Database session
 ):
     """
@@ -270,11 +536,11 @@ async def get_my_bills(
     - Other hotels' bills are not accessible
     
     Args:
-        current_hotel (dict): Hotel info from JWT token (auto-injected)
+        current_hotel (HotelClaims): Hotel info from JWT token (auto-injected)
         db (Session): Database session (auto-injected)
     
     Returns:
-        dict: Contains list of bills with all metadata
+        BillList: Contains list of bills with all metadata
     
     Request Example:
         GET /bills/my-bills
@@ -282,6 +548,7 @@ async def get_my_bills(
     
     Response Example:
         {
+            "hotel_name": "Grand Resort Hotel",
             "bills": [
                 {
                     "id": 123,
@@ -291,9 +558,8 @@ async def get_my_bills(
                     "bill_amount": "1450.75",
                     "unit": "kWh",
                     "hotel_id": 456,
-                    "hotel_name": "Grand Resort Hotel",
-                    "file_url": "https://bucket.s3.amazonaws.com/file.pdf",
-                    "uploaded_at": "2024-03-15T10:30:00"
+                    "file_url": "https://bucket.s3.ap-south-1.amazonaws.com/file.pdf",
+                    "uploaded_at": "2024-03-15T10:30:00Z"
                 },
                 {
                     "id": 124,
@@ -303,34 +569,189 @@ async def get_my_bills(
                     "bill_amount": "2500",
                     "unit": "liters",
                     "hotel_id": 456,
-                    "hotel_name": "Grand Resort Hotel",
-                    "file_url": "https://bucket.s3.amazonaws.com/file2.pdf",
-                    "uploaded_at": "2024-03-16T11:45:00"
+                    "file_url": "https://bucket.s3.ap-south-1.amazonaws.com/file2.pdf",
+                    "uploaded_at": "2024-03-16T11:45:00Z"
                 }
             ]
         }
     """
     # Extract hotel ID from authenticated user
-    hotel_id = current_hotel["hotel_id"]
+    hotel_id = current_hotel.hotel_id
     
     # Query database for all bills belonging to this hotel
     # Filter ensures hotel only sees their own bills
-    bills = db.query(models.UtilityBill).filter(
-        models.UtilityBill.hotel_id == hotel_id
-    ).all()
+    result = db.execute(MY_BILLS_STMT, {"hotel_id": hotel_id})
+    # The hotel's current name, given once for the whole list. A still-valid
+    # token can outlive its hotel row; fall back to the name in the token
+    # rather than failing the request
+    hotel_name = db.execute(HOTEL_NAME_STMT, {"hotel_id": hotel_id}).scalar_one_or_none()
+    if hotel_name is None:
+        hotel_name = current_hotel.hotel_name
     
     # Return bills list
-    # SQLAlchemy objects are automatically converted to JSON by FastAPI
-    return {"bills": bills}
+    # The rows come from the database with the response's field names and
+    # JSON-ready values, so they are serialized directly by orjson - no
+    # per-field validation through the BillList/UtilityBill response model
+    return Response(content=serialize_bill_rows(hotel_name, result), media_type="application/json")
 
 # =============================================================================
 # CARBON FOOTPRINT CALCULATION ENDPOINT
 # =============================================================================
 
-@router.get("/carbon-footprint")
-async def calculate_carbon_footprint(
+class _ResultCache:
+    """
+    Small thread-safe LRU cache for computed results.
+    
+    Sync endpoints run in a threadpool, so access is guarded by a lock.
+    Once full, the least recently used entry is dropped. With ttl_seconds,
+    entries also expire that long after they were stored.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self._entries = OrderedDict()  # key -> (expiry time or None, value)
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires_at = None
+        if self._ttl_seconds is not None:
+            expires_at = time.monotonic() + self._ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+# Carbon footprints keyed by (hotel_id, year, ready bill count, newest ready bill id)
+# Per process; results are small (one entry per month of data)
+_carbon_footprint_cache = _ResultCache(max_size=1024)
+
+def compute_carbon_footprint(hotel_id: int, year: Optional[int], db: Session) -> dict:
+    """
+    Calculate a hotel's carbon footprint from its ready bills.
+    
+    Purpose: The database work behind GET /bills/carbon-footprint, kept apart
+    from the endpoint so its result can be cached (see the endpoint).
+    
+    Args:
+        hotel_id (int): Hotel to calculate for
+        year (int, optional): Only include bills of this year
+        db (Session): Database session
+    
+    Returns:
+        dict: The endpoint's response without the hotel name
+    """
+    # Build an aggregate query over the hotel's bills
+    # (only bills whose file upload completed)
+    # The database pivots the bills into one row per (year, month), with the
+    # summed electricity and water consumption as columns - at most 12 small
+    # rows per year come back instead of every bill row, already in the
+    # shape of the monthly breakdown
+    # The monthly CO2 is summed there as well: each bill's amount is multiplied
+    # by its type's factor via a CASE generated from BILL_EMISSION_FACTORS, so
+    # there is no per-type branching or factor lookup left in Python
+    bill_type = models.UtilityBill.bill_type
+    bill_amount = models.UtilityBill.bill_amount
+    emission_factor = case(dict(BILL_EMISSION_FACTORS), value=bill_type, else_=0)
+    query = db.query(
+        models.UtilityBill.bill_year,
+        models.UtilityBill.bill_month,
+        summed_as_float(case((bill_type == "electricity", bill_amount), else_=0)).label("electricity"),
+        summed_as_float(case((bill_type == "water", bill_amount), else_=0)).label("water"),
+        summed_as_float(bill_amount * emission_factor).label("co2")
+    ).filter(
+        models.UtilityBill.hotel_id == hotel_id,
+        models.UtilityBill.status == models.BILL_STATUS_READY
+    )
+    
+    # Filter by year if specified
+    if year:
+        query = query.filter(models.UtilityBill.bill_year == year)
+    
+    monthly_totals = query.group_by(
+        models.UtilityBill.bill_year,
+        models.UtilityBill.bill_month
+    ).order_by(
+        models.UtilityBill.bill_year,
+        models.UtilityBill.bill_month
+    ).all()
+    
+    # Carbon emission factors (kg CO2 per unit)
+    electricity_factor = BILL_EMISSION_FACTORS["electricity"]
+    water_factor = BILL_EMISSION_FACTORS["water"]
+    
+    # Build the monthly breakdown straight from the pivoted rows
+    # Amounts are numeric in the database and the sums arrive as floats, so no
+    # parsing, conversion or skipping is needed
+    total_electricity = 0.0
+    total_water = 0.0
+    monthly_breakdown = []
+    # Every number is rounded once here, so responses carry short values
+    for bill_year, bill_month, electricity_kwh, water_liters, co2_kg in monthly_totals:
+        total_electricity += electricity_kwh
+        total_water += water_liters
+        monthly_breakdown.append({
+            "month": bill_month,
+            "year": bill_year,
+            "electricity_kwh": round(electricity_kwh, 3),
+            "water_liters": round(water_liters, 3),
+            "total_co2_kg": round(co2_kg, 3)
+        })
+    
+    # Totals per utility type, with units and factors
+    total_electricity = round(total_electricity, 3)
+    total_water = round(total_water, 3)
+    electricity_co2 = round(total_electricity * electricity_factor, 3)
+    water_co2 = round(total_water * water_factor, 3)
+    total_co2 = electricity_co2 + water_co2
+    breakdown = {
+        "electricity": {
+            "total_consumption": f"{total_electricity} kWh",
+            "co2_emissions_kg": electricity_co2,
+            "unit": "kWh",
+            "factor_used": f"{electricity_factor} kg CO2 per kWh"
+        },
+        "water": {
+            "total_consumption": f"{total_water} liters",
+            "co2_emissions_kg": water_co2,
+            "unit": "liters",
+            "factor_used": f"{water_factor} kg CO2 per liters"
+        }
+    }
+    
+    return {
+        "calculation_year": year or "all years",
+        "total_co2_kg": round(total_co2, 3),
+        "breakdown": breakdown,
+        "monthly_breakdown": monthly_breakdown,
+        "note": "Emission factors are approximate and may vary by region. For precise calculations, consult local grid emission factors."
+    }
+
+# Plain "def" (not "async def"): the endpoint only does blocking database
+# work, so FastAPI runs it in the threadpool and the event loop stays free
+# The result is returned as an ORJSONResponse: serialized by orjson (C) in one
+# step, without FastAPI's jsonable_encoder pass over the nested dicts
+@router.get("/carbon-footprint", response_class=ORJSONResponse)
+def calculate_carbon_footprint(
     year: int = None,  # Optional: Calculate for specific year
-    current_hotel: dict = Depends(get_current_hotel),
+    current_hotel: HotelClaims = Depends(get_current_hotel),
     db: Session = Depends(database.get_db)
 ):
     """
@@ -341,7 +762,8 @@ async def calculate_carbon_footprint(
     
     How it works:
     1. Validates JWT token to identify the hotel
-    2. Retrieves all bills for the hotel (optionally filtered by year)
+    2. Sums the hotel's consumption per month and bill type in the database
+       (optionally filtered by year)
     3. Applies carbon emission factors to consumption amounts
     4. Calculates total CO2 emissions
     5. Returns detailed breakdown by utility type and month
@@ -352,7 +774,7 @@ async def calculate_carbon_footprint(
     
     Args:
         year (int, optional): Calculate for specific year only
-        current_hotel (dict): Hotel info from JWT token (auto-injected)
+        current_hotel (HotelClaims): Hotel info from JWT token (auto-injected)
         db (Session): Database session (auto-injected)
     
     Returns:
@@ -371,101 +793,55 @@ async def calculate_carbon_footprint(
                 "electricity": {
                     "total_consumption": "1450.75 kWh",
                     "co2_emissions_kg": 725.375,
+                    "unit": "kWh",
                     "factor_used": "0.5 kg CO2 per kWh"
                 },
                 "water": {
-                    "total_consumption": "0 liters",
-                    "co2_emissions_kg": 0,
-                    "factor_used": "0.001 kg CO2 per liter"
+                    "total_consumption": "0.0 liters",
+                    "co2_emissions_kg": 0.0,
+                    "unit": "liters",
+                    "factor_used": "0.001 kg CO2 per liters"
                 }
             },
             "monthly_breakdown": [
                 {
                     "month": 3,
-                    "electricity_kwh": "1450.75",
-                    "water_liters": "0",
+                    "year": 2024,
+                    "electricity_kwh": 1450.75,
+                    "water_liters": 0.0,
                     "total_co2_kg": 725.375
                 }
-            ]
+            ],
+            "note": "Emission factors are approximate and may vary by region. For precise calculations, consult local grid emission factors."
         }
     """
     # Extract hotel ID from authenticated user
-    hotel_id = current_hotel["hotel_id"]
-    hotel_name = current_hotel["hotel_name"]
-    
-    # Build query for hotel's bills
-    query = db.query(models.UtilityBill).filter(models.UtilityBill.hotel_id == hotel_id)
-    
-    # Filter by year if specified
-    if year:
-        query = query.filter(models.UtilityBill.bill_year == year)
-    
-    bills = query.all()
-    
-    # Carbon emission factors (kg CO2 per unit)
-    emission_factors = {
-        "electricity": 0.5,    # kg CO2 per kWh (varies by region)
-        "water": 0.001         # kg CO2 per liter (includes treatment)
-    }
-    
-    # Initialize calculations
-    total_co2 = 0.0
-    breakdown = {
-        "electricity": {"total_consumption": 0.0, "co2_emissions_kg": 0.0, "unit": "kWh"},
-        "water": {"total_consumption": 0.0, "co2_emissions_kg": 0.0, "unit": "liters"}
-    }
-    monthly_data = {}
-    
-    # Process each bill
-    for bill in bills:
-        try:
-            # Convert amount to float for calculations
-            amount = float(bill.bill_amount)
-            bill_type = bill.bill_type.lower()
-            
-            # Get emission factor
-            factor = emission_factors.get(bill_type, 0)
-            
-            # Calculate CO2 emissions for this bill
-            co2_emissions = amount * factor
-            total_co2 += co2_emissions
-            
-            # Add to breakdown
-            if bill_type in breakdown:
-                breakdown[bill_type]["total_consumption"] += amount
-                breakdown[bill_type]["co2_emissions_kg"] += co2_emissions
-            
-            # Add to monthly breakdown
-            month_key = f"{bill.bill_year}-{bill.bill_month:02d}"
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {"month": bill.bill_month, "year": bill.bill_year, "electricity_kwh": 0, "water_liters": 0, "total_co2_kg": 0}
-            
-            if bill_type == "electricity":
-                monthly_data[month_key]["electricity_kwh"] += amount
-            elif bill_type == "water":
-                monthly_data[month_key]["water_liters"] += amount
-                
-            monthly_data[month_key]["total_co2_kg"] += co2_emissions
-            
-        except (ValueError, TypeError):
-            # Skip bills with invalid amounts
-            continue
-    
-    # Format breakdown with units and factors
-    for bill_type in breakdown:
-        unit = breakdown[bill_type]["unit"]
-        consumption = breakdown[bill_type]["total_consumption"]
-        breakdown[bill_type]["total_consumption"] = f"{consumption} {unit}"
-        breakdown[bill_type]["factor_used"] = f"{emission_factors.get(bill_type, 0)} kg CO2 per {unit}"
-    
-    return {
-        "hotel_name": hotel_name,
-        "calculation_year": year or "all years",
-        "total_co2_kg": round(total_co2, 3),
-        "breakdown": breakdown,
-        "monthly_breakdown": list(monthly_data.values()),
-        "note": "Emission factors are approximate and may vary by region. For precise calculations, consult local grid emission factors."
-    }
+    hotel_id = current_hotel.hotel_id
+    hotel_name = current_hotel.hotel_name
+    
+    # Number and newest id of the hotel's ready bills (one index-only scan)
+    # Ready bills are never changed or removed, and every bill that becomes
+    # ready raises the count - even an older pending bill that completes after
+    # a newer one, which leaves the newest id unchanged. So the pair versions
+    # the cached result in every worker: a stale result can never be served,
+    # no explicit invalidation needed
+    ready_bill_count, latest_bill_id = db.query(
+        func.count(),
+        func.max(models.UtilityBill.id)
+    ).filter(
+        models.UtilityBill.hotel_id == hotel_id,
+        models.UtilityBill.status == models.BILL_STATUS_READY
+    ).one()
+    
+    # Reuse the calculation while the hotel's bills are unchanged
+    # (e.g. dashboards polling the same figures)
+    cache_key = (hotel_id, year, ready_bill_count, latest_bill_id)
+    footprint = _carbon_footprint_cache.get(cache_key)
+    if footprint is None:
+        footprint = compute_carbon_footprint(hotel_id, year, db)
+        _carbon_footprint_cache.put(cache_key, footprint)
+    
+    return ORJSONResponse({"hotel_name": hotel_name, **footprint})
 
 # =============================================================================
 # TRAVEL AGENT ENDPOINTS - TRIP MANAGEMENT
@@ -477,7 +853,7 @@ trip_router = APIRouter(prefix="/trips", tags=["Trips"])
 @trip_router.post("/create", response_model=schemas.TripCarbonResponse)
 def create_trip(
     trip: schemas.TripCreate,
-    current_agent: models.TravelAgent = Depends(get_current_travel_agent),
+    current_agent: AgentClaims = Depends(get_current_agent_claims),
     db: Session = Depends(database.get_db)
 ):
     """
@@ -534,18 +910,18 @@ def create_trip(
     """
     
     # Create main trip record
-    db_trip = models.Trip(
-        trip_name=trip.trip_name,
-        trip_description=trip.trip_description,
-        number_of_tourists=trip.number_of_tourists,
-        start_date=trip.start_date,
-        end_date=trip.end_date,
-        travel_agent_id=current_agent.id
-    )
-    
-    db.add(db_trip)
-    db.commit()
-    db.refresh(db_trip)
+    # A single INSERT ... RETURNING id: the trip has nothing to cascade, so
+    # there's no need for an ORM object and the unit-of-work machinery.
+    # The new id links the component rows; everything is committed together
+    # at the end.
+    trip_id = db.execute(INSERT_TRIP_STMT, {
+        "trip_name": trip.trip_name,
+        "trip_description": trip.trip_description,
+        "number_of_tourists": trip.number_of_tourists,
+        "start_date": trip.start_date,
+        "end_date": trip.end_date,
+        "travel_agent_id": current_agent.id
+    }).scalar_one()
     
     # Initialize carbon tracking variables
     total_flights_carbon = 0.0
@@ -556,15 +932,19 @@ def create_trip(
     transport_details = []
     hotel_details = []
     
+    # Component rows are collected here and inserted in bulk after the loops
+    flight_rows = []
+    transport_rows = []
+    hotel_stay_rows = []
+    
     # Process flight segments
     for flight_data in trip.flight_segments:
-        db_flight = models.FlightSegment(
-            trip_id=db_trip.id,
-            departure_airport=flight_data.departure_airport,
-            arrival_airport=flight_data.arrival_airport,
-            transit_airports=flight_data.transit_airports
-        )
-        db.add(db_flight)
+        flight_rows.append({
+            "trip_id": trip_id,
+            "departure_airport": flight_data.departure_airport,
+            "arrival_airport": flight_data.arrival_airport,
+            "transit_airports": flight_data.transit_airports
+        })
         
         # Calculate flight carbon footprint
         flight_carbon = calculate_flight_carbon(
@@ -582,12 +962,11 @@ def create_trip(
     
     # Process local transportation
     for transport_data in trip.local_transports:
-        db_transport = models.LocalTransport(
-            trip_id=db_trip.id,
-            vehicle_type=transport_data.vehicle_type,
-            distance_km=transport_data.distance_km
-        )
-        db.add(db_transport)
+        transport_rows.append({
+            "trip_id": trip_id,
+            "vehicle_type": transport_data.vehicle_type,
+            "distance_km": transport_data.distance_km
+        })
         
         # Calculate transport carbon footprint
         transport_carbon = calculate_transport_carbon(
@@ -604,29 +983,39 @@ def create_trip(
             "passengers": trip.number_of_tourists
         })
     
+    # Look up the names of all hotels in the trip with a single IN query,
+    # instead of one query per hotel stay
+    hotel_ids = {hotel_data.hotel_id for hotel_data in trip.hotel_stays}
+    hotel_names = dict(
+        db.query(models.Hotel.id, models.Hotel.name)
+        .filter(models.Hotel.id.in_(hotel_ids))
+        .all()
+    ) if hotel_ids else {}
+    
+    # Average daily emissions of the same hotels, also in a single query
+    avg_daily_emissions = precompute_avg_daily_emissions(hotel_ids, db)
+    
     # Process hotel stays
     for hotel_data in trip.hotel_stays:
-        db_hotel_stay = models.HotelStay(
-            trip_id=db_trip.id,
-            hotel_id=hotel_data.hotel_id,
-            number_of_nights=hotel_data.number_of_nights,
-            check_in_date=hotel_data.check_in_date,
-            check_out_date=hotel_data.check_out_date
-        )
-        db.add(db_hotel_stay)
+        hotel_stay_rows.append({
+            "trip_id": trip_id,
+            "hotel_id": hotel_data.hotel_id,
+            "number_of_nights": hotel_data.number_of_nights,
+            "check_in_date": hotel_data.check_in_date,
+            "check_out_date": hotel_data.check_out_date
+        })
         
         # Calculate hotel carbon footprint based on hotel's average consumption
         hotel_carbon = calculate_hotel_stay_carbon(
             hotel_data.hotel_id,
             hotel_data.number_of_nights,
             trip.number_of_tourists,
-            db
+            avg_daily_emissions
         )
         total_hotels_carbon += hotel_carbon
         
         # Get hotel name for details
-        hotel_record = db.query(models.Hotel).filter(models.Hotel.id == hotel_data.hotel_id).first()
-        hotel_name = hotel_record.name if hotel_record else "Unknown Hotel"
+        hotel_name = hotel_names.get(hotel_data.hotel_id, "Unknown Hotel")
         
         hotel_details.append({
             "hotel_name": hotel_name,
@@ -635,7 +1024,15 @@ def create_trip(
             "guests": trip.number_of_tourists
         })
     
-    # Commit all trip components
+    # Save all trip components
+    # One multi-row INSERT per component table (batched by the psycopg2 driver)
+    # instead of one INSERT round trip per flight, transport and stay
+    if flight_rows:
+        db.execute(insert(models.FlightSegment), flight_rows)
+    if transport_rows:
+        db.execute(insert(models.LocalTransport), transport_rows)
+    if hotel_stay_rows:
+        db.execute(insert(models.HotelStay), hotel_stay_rows)
     db.commit()
     
     # Calculate totals
@@ -643,8 +1040,8 @@ def create_trip(
     carbon_per_tourist = total_carbon / trip.number_of_tourists if trip.number_of_tourists > 0 else 0
     
     return schemas.TripCarbonResponse(
-        trip_id=db_trip.id,
-        trip_name=db_trip.trip_name,
+        trip_id=trip_id,
+        trip_name=trip.trip_name,
         number_of_tourists=trip.number_of_tourists,
         total_carbon_kg=round(total_carbon, 3),
         carbon_per_tourist_kg=round(carbon_per_tourist, 3),
@@ -656,10 +1053,25 @@ def create_trip(
         hotel_details=hotel_details
     )
 
-@trip_router.get("/my-trips")
+# Trips are read from the database and serialized in batches of this size
+MY_TRIPS_BATCH_SIZE = 500
+
+# The response is streamed: the JSON is written batch by batch as the trips are
+# read, so the first bytes go out right away and memory use stays at one batch
+# however many trips an agent has. orjson (as for /bills/carbon-footprint)
+# serializes each batch, including the trip datetimes
+#
+# The stream does not use the request's get_db session. Depending on the
+# FastAPI version, a yield-dependency is closed either after the response is
+# sent or as soon as the handler returns - before the body streams - so the
+# generator owns a session of its own and closes it when it is done.
+# The first batch is read before the StreamingResponse is returned: once the
+# first chunk is sent the status is fixed at 200, so doing the query and the
+# first batch's lookups here lets the common failures (database unreachable,
+# bad query) still come back as a proper error status
+@trip_router.get("/my-trips", response_class=StreamingResponse)
 def get_my_trips(
-    current_agent: models.TravelAgent = Depends(get_current_travel_agent),
-    db: Session = Depends(database.get_db)
+    current_agent: AgentClaims = Depends(get_current_agent_claims)
 ):
     """
     Get all trips created by the current travel agent.
@@ -669,16 +1081,63 @@ def get_my_trips(
     
     Returns:
         List of trips with carbon footprint information
+        (streamed; total_trips comes after the trips)
+    """
+    db = database.SessionLocal()
+    try:
+        # Load only the trip columns the summaries need, as plain rows (no ORM
+        # objects, and none of the trips' components)
+        # Flights and transports are not loaded at all: their emissions are
+        # summed by the database (see summarize_trip_batch)
+        # yield_per fetches the rows MY_TRIPS_BATCH_SIZE at a time (a
+        # server-side cursor on PostgreSQL) instead of all at once
+        trip_batches = db.execute(
+            select(*TRIP_SUMMARY_COLUMNS)
+            .where(models.Trip.travel_agent_id == current_agent.id)
+            .execution_options(yield_per=MY_TRIPS_BATCH_SIZE)
+        ).partitions()
+        first_summaries = summarize_trip_batch(next(trip_batches, []), db)
+    except Exception:
+        db.close()
+        raise
+    
+    return StreamingResponse(
+        stream_trip_summaries(current_agent.name, first_summaries, trip_batches, db),
+        media_type="application/json"
+    )
+
+def summarize_trip_batch(trips, db: Session) -> list:
     """
-    trips = db.query(models.Trip).filter(models.Trip.travel_agent_id == current_agent.id).all()
+    Build the /trips/my-trips summaries of one batch of trips.
+    
+    The batch's hotel stays, its flight/transport emissions and the average
+    daily emissions of its hotels are loaded with one query each.
+    
+    Args:
+        trips: Trip rows (TRIP_SUMMARY_COLUMNS)
+        db (Session): Database session
+    
+    Returns:
+        list: One orjson-serialized summary (bytes) per trip
+    """
+    trip_ids = [trip.id for trip in trips]
+    if not trip_ids:
+        return []
+    hotel_stays = load_hotel_stays(trip_ids, db)
+    travel_carbon = precompute_travel_carbon(trip_ids, db)
+    avg_daily_emissions = precompute_avg_daily_emissions(
+        (stay.hotel_id for stays in hotel_stays.values() for stay in stays), db
+    )
     
     trip_summaries = []
     for trip in trips:
-        # Calculate total carbon for this trip
-        total_carbon = calculate_trip_total_carbon(trip.id, db)
+        # Calculate total carbon for this trip (no further queries)
+        total_carbon = calculate_trip_total_carbon(
+            trip, hotel_stays[trip.id], travel_carbon, avg_daily_emissions
+        )
         carbon_per_tourist = total_carbon / trip.number_of_tourists if trip.number_of_tourists > 0 else 0
         
-        trip_summaries.append({
+        trip_summaries.append(orjson.dumps({
             "trip_id": trip.id,
             "trip_name": trip.trip_name,
             "number_of_tourists": trip.number_of_tourists,
@@ -687,18 +1146,48 @@ def get_my_trips(
             "total_carbon_kg": round(total_carbon, 3),
             "carbon_per_tourist_kg": round(carbon_per_tourist, 3),
             "created_at": trip.created_at
-        })
+        }))
+    return trip_summaries
+
+def stream_trip_summaries(agent_name: str, first_summaries: list, trip_batches, db: Session):
+    """
+    Generate the /trips/my-trips JSON document in chunks.
     
-    return {
-        "agent_name": current_agent.name,
-        "total_trips": len(trip_summaries),
-        "trips": trip_summaries
-    }
+    How it works:
+    1. The opening of the document is sent with the first batch's summaries
+       (already built by get_my_trips)
+    2. Each remaining batch is summarized (summarize_trip_batch) and sent as
+       one chunk
+    3. The document is closed with the number of trips sent
+    
+    Args:
+        agent_name (str): Name of the travel agent
+        first_summaries (list): Serialized summaries of the first batch
+        trip_batches: Remaining batches of trip rows (TRIP_SUMMARY_COLUMNS)
+        db (Session): Session opened by get_my_trips for this stream; it is
+                      closed here once the stream ends or is abandoned
+    
+    Yields:
+        bytes: Consecutive pieces of the JSON response
+    """
+    try:
+        yield b'{"agent_name":' + orjson.dumps(agent_name) + b',"trips":[' + b",".join(first_summaries)
+        total_trips = len(first_summaries)
+        
+        for trips in trip_batches:
+            trip_summaries = summarize_trip_batch(trips, db)
+            # Batches after the first continue the list with a comma
+            yield (b"," if total_trips else b"") + b",".join(trip_summaries)
+            total_trips += len(trip_summaries)
+        
+        yield b'],"total_trips":' + orjson.dumps(total_trips) + b"}"
+    finally:
+        db.close()
 
-@trip_router.get("/{trip_id}/carbon")
+@trip_router.get("/{trip_id}/carbon", response_class=ORJSONResponse)
 def get_trip_carbon_details(
     trip_id: int,
-    current_agent: models.TravelAgent = Depends(get_current_travel_agent),
+    current_agent: AgentClaims = Depends(get_current_agent_claims),
     db: Session = Depends(database.get_db)
 ):
     """
@@ -708,149 +1197,344 @@ def get_trip_carbon_details(
     including breakdown by flights, transport, and hotels.
     """
     # Verify trip belongs to current agent
-    trip = db.query(models.Trip).filter(
-        models.Trip.id == trip_id,
-        models.Trip.travel_agent_id == current_agent.id
+    # (only the columns needed here, as a plain row)
+    trip = db.execute(
+        select(*TRIP_SUMMARY_COLUMNS).where(
+            models.Trip.id == trip_id,
+            models.Trip.travel_agent_id == current_agent.id
+        )
     ).first()
     
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     
     # Get detailed carbon breakdown (reuse logic from create_trip)
-    total_carbon = calculate_trip_total_carbon(trip_id, db)
+    hotel_stays = load_hotel_stays((trip.id,), db)[trip.id]
+    travel_carbon = precompute_travel_carbon((trip.id,), db)
+    avg_daily_emissions = precompute_avg_daily_emissions(
+        (stay.hotel_id for stay in hotel_stays), db
+    )
+    total_carbon = calculate_trip_total_carbon(
+        trip, hotel_stays, travel_carbon, avg_daily_emissions
+    )
     carbon_breakdown = get_trip_carbon_breakdown(trip_id, db)
     
-    return {
+    return ORJSONResponse({
         "trip_id": trip.id,
         "trip_name": trip.trip_name,
         "number_of_tourists": trip.number_of_tourists,
         "total_carbon_kg": round(total_carbon, 3),
         "carbon_per_tourist_kg": round(total_carbon / trip.number_of_tourists, 3),
         **carbon_breakdown
-    }
+    })
 
 # =============================================================================
 # CARBON CALCULATION HELPER FUNCTIONS FOR TRIPS
 # =============================================================================
 
+# Airport coordinates (IATA code -> latitude, longitude in degrees)
+# Flight distances are computed from these, so any pair of listed airports
+# works without maintaining a table of routes. Add airports as needed.
+AIRPORT_COORDINATES = {
+    # North America
+    "JFK": (40.6413, -73.7781),    # New York JFK
+    "LAX": (33.9416, -118.4085),   # Los Angeles
+    "ORD": (41.9742, -87.9073),    # Chicago O'Hare
+    "ATL": (33.6407, -84.4277),    # Atlanta
+    "DFW": (32.8998, -97.0403),    # Dallas/Fort Worth
+    "SFO": (37.6213, -122.3790),   # San Francisco
+    "YYZ": (43.6777, -79.6248),    # Toronto
+    # Europe
+    "LHR": (51.4700, -0.4543),     # London Heathrow
+    "CDG": (49.0097, 2.5479),      # Paris Charles de Gaulle
+    "AMS": (52.3105, 4.7683),      # Amsterdam
+    "FRA": (50.0379, 8.5622),      # Frankfurt
+    "MUC": (48.3538, 11.7861),     # Munich
+    "MAD": (40.4983, -3.5676),     # Madrid
+    "BCN": (41.2974, 2.0833),      # Barcelona
+    "FCO": (41.8003, 12.2389),     # Rome Fiumicino
+    "ATH": (37.9364, 23.9445),     # Athens
+    "IST": (41.2753, 28.7519),     # Istanbul
+    # Middle East & Asia
+    "DXB": (25.2532, 55.3657),     # Dubai
+    "DOH": (25.2731, 51.6081),     # Doha
+    "DEL": (28.5562, 77.1000),     # Delhi
+    "BOM": (19.0896, 72.8656),     # Mumbai
+    "BLR": (13.1986, 77.7066),     # Bengaluru
+    "SIN": (1.3644, 103.9915),     # Singapore
+    "HKG": (22.3080, 113.9185),    # Hong Kong
+    "PEK": (40.0799, 116.6031),    # Beijing Capital
+    "ICN": (37.4602, 126.4407),    # Seoul Incheon
+    "NRT": (35.7720, 140.3929),    # Tokyo Narita
+    "HND": (35.5494, 139.7798),    # Tokyo Haneda
+    # Oceania, South America & Africa
+    "SYD": (-33.9399, 151.1753),   # Sydney
+    "GRU": (-23.4356, -46.4731),   # São Paulo
+    "JNB": (-26.1367, 28.2411),    # Johannesburg
+}
+
+# The same coordinates in radians, converted once for the distance formula
+_AIRPORT_RADIANS = {
+    code: (math.radians(lat), math.radians(lon))
+    for code, (lat, lon) in AIRPORT_COORDINATES.items()
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+def _haversine_km(start, end) -> float:
+    """
+    Great-circle distance in km between two (latitude, longitude) points in
+    radians (haversine formula).
+    """
+    lat1, lon1 = start
+    lat2, lon2 = end
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+# Distances between every pair of listed airports, computed once at import
+# (a few hundred entries). The key is the frozenset of both codes, so a route
+# and its return flight share one entry and one lookup finds either direction.
+_AIRPORT_DISTANCES = {
+    frozenset((departure, arrival)): _haversine_km(
+        _AIRPORT_RADIANS[departure], _AIRPORT_RADIANS[arrival]
+    )
+    for departure, arrival in combinations_with_replacement(_AIRPORT_RADIANS, 2)
+}
+
+def airport_distance_km(departure: str, arrival: str):
+    """
+    Great-circle distance between two airports in km.
+    
+    Returns None if either airport code is not in AIRPORT_COORDINATES.
+    """
+    return _AIRPORT_DISTANCES.get(
+        frozenset((departure.strip().upper(), arrival.strip().upper()))
+    )
+
 def calculate_flight_carbon(departure: str, arrival: str, passengers: int) -> float:
     """
     Calculate carbon emissions for a flight segment.
     
-    Uses simplified distance-based calculation.
+    Uses the great-circle distance between the two airports.
     In production, you would use actual flight emission APIs.
     """
-    # Simplified airport distance mapping (in km)
-    airport_distances = {
-        ("JFK", "LHR"): 5550,  # New York to London
-        ("LHR", "CDG"): 350,   # London to Paris
-        ("CDG", "FCO"): 1110,  # Paris to Rome
-        ("FCO", "ATH"): 1050,  # Rome to Athens
-        # Add more routes as needed
-    }
-    
-    # Try to find distance in both directions
-    distance = airport_distances.get((departure, arrival)) or airport_distances.get((arrival, departure))
+    distance = airport_distance_km(departure, arrival)
     
-    if not distance:
-        # Default estimation: 500km for unknown routes
+    if distance is None:
+        # Default estimation: 500km for unknown airports
         distance = 500
     
-    # Aviation emission factor: approximately 0.255 kg CO2 per passenger-km
-    emission_factor = 0.255
-    
-    return distance * emission_factor * passengers
+    return distance * FLIGHT_EMISSION_FACTOR * passengers
 
 def calculate_transport_carbon(vehicle_type: str, distance_km: float, passengers: int) -> float:
     """
     Calculate carbon emissions for local transportation.
     """
-    # Emission factors (kg CO2 per passenger-km)
-    transport_factors = {
-        "bus": 0.089,
-        "car": 0.171,
-        "train": 0.041,
-        "taxi": 0.171,
-        "metro": 0.033
-    }
-    
-    factor = transport_factors.get(vehicle_type.lower(), 0.171)  # Default to car
+    factor = TRANSPORT_EMISSION_FACTORS.get(vehicle_type.lower(), TRANSPORT_DEFAULT_FACTOR)
     return distance_km * factor * passengers
 
-def calculate_hotel_stay_carbon(hotel_id: int, nights: int, guests: int, db: Session) -> float:
+# Trip columns read by the trip listing/detail endpoints and the carbon
+# calculation - selected as plain rows instead of whole Trip objects
+TRIP_SUMMARY_COLUMNS = (
+    models.Trip.id,
+    models.Trip.trip_name,
+    models.Trip.number_of_tourists,
+    models.Trip.start_date,
+    models.Trip.end_date,
+    models.Trip.created_at,
+)
+
+def load_hotel_stays(trip_ids, db: Session) -> dict:
     """
-    Calculate carbon emissions for hotel stays based on hotel's average consumption.
+    Hotel stays of several trips, in one query.
+    
+    Only the columns the carbon calculation needs are selected, as plain rows
+    (with .hotel_id and .number_of_nights), so no HotelStay objects are built.
+    
+    Returns:
+        dict: trip_id -> list of stay rows (empty for trips without stays)
+    """
+    trip_ids = set(trip_ids)
+    hotel_stays = {trip_id: [] for trip_id in trip_ids}
+    if not trip_ids:
+        return hotel_stays
+    
+    stay = models.HotelStay
+    rows = db.execute(
+        select(stay.trip_id, stay.hotel_id, stay.number_of_nights)
+        .where(stay.trip_id.in_(trip_ids))
+    ).all()
+    for row in rows:
+        hotel_stays[row.trip_id].append(row)
+    return hotel_stays
+
+def precompute_travel_carbon(trip_ids, db: Session) -> dict:
     """
-    # Get hotel's average daily consumption from their bills
-    hotel_bills = db.query(models.UtilityBill).filter(models.UtilityBill.hotel_id == hotel_id).all()
+    Flight and local transport emissions of several trips, per tourist.
     
-    if not hotel_bills:
-        # Default hotel emission: 30 kg CO2 per room-night
-        return 30.0 * nights * (guests / 2)  # Assume 2 guests per room
+    Purpose: These emissions are linear in the segments' columns, so the
+    database can add them up: instead of loading every flight and transport
+    row, it returns one row per distinct route and per vehicle type.
     
-    # Calculate average daily consumption from hotel's bills
-    total_emissions = 0.0
-    total_days = 0
+    How it works:
+    1. Flights are counted per (trip, departure, arrival); each route's
+       distance is looked up once and multiplied by its count
+    2. Transport distances are summed per (trip, vehicle type); each sum is
+       multiplied by the vehicle's factor
     
-    emission_factors = {
-        "electricity": 0.708,
-        "gas": 2.204,
-        "water": 0.298,
-        "diesel": 2.687
-    }
+    Args:
+        trip_ids: IDs of the trips to compute (any iterable)
+        db (Session): Database session
     
-    for bill in hotel_bills:
-        if bill.consumption_amount and bill.consumption_amount > 0:
-            bill_emissions = bill.consumption_amount * emission_factors.get(bill.bill_type, 0.5)
-            
-            # Estimate days covered by this bill (assume monthly bills)
-            days_in_bill = 30
-            daily_emissions = bill_emissions / days_in_bill
-            
-            total_emissions += daily_emissions
-            total_days += 1
-    
-    if total_days > 0:
-        average_daily_emissions = total_emissions / total_days
-        return average_daily_emissions * nights * (guests / 2)  # Per room calculation
-    else:
-        # Fallback to default
-        return 30.0 * nights * (guests / 2)
-
-def calculate_trip_total_carbon(trip_id: int, db: Session) -> float:
-    """Calculate total carbon footprint for a trip."""
-    trip = db.query(models.Trip).filter(models.Trip.id == trip_id).first()
-    if not trip:
-        return 0.0
+    Returns:
+        dict: trip_id -> kg CO2 per tourist (0.0 for trips without segments);
+              multiply by the trip's number of tourists
+    """
+    trip_ids = set(trip_ids)
+    travel_carbon = dict.fromkeys(trip_ids, 0.0)
+    if not trip_ids:
+        return travel_carbon
+    
+    flight = models.FlightSegment
+    flight_routes = db.execute(
+        select(flight.trip_id, flight.departure_airport, flight.arrival_airport, func.count())
+        .where(flight.trip_id.in_(trip_ids))
+        .group_by(flight.trip_id, flight.departure_airport, flight.arrival_airport)
+    ).all()
+    for trip_id, departure, arrival, flight_count in flight_routes:
+        travel_carbon[trip_id] += calculate_flight_carbon(departure, arrival, 1) * flight_count
+    
+    # Vehicle types are grouped case-insensitively, like the factor lookup
+    transport = models.LocalTransport
+    vehicle_type = func.lower(transport.vehicle_type)
+    transport_distances = db.execute(
+        select(transport.trip_id, vehicle_type, summed_as_float(transport.distance_km))
+        .where(transport.trip_id.in_(trip_ids))
+        .group_by(transport.trip_id, vehicle_type)
+    ).all()
+    for trip_id, vehicle, distance_km in transport_distances:
+        travel_carbon[trip_id] += calculate_transport_carbon(vehicle, distance_km, 1)
     
-    total_carbon = 0.0
+    return travel_carbon
+
+# Average daily emissions per hotel_id (None for hotels without usable bills)
+# A hotel's entry is dropped when it uploads a bill. The cache is per process,
+# so other workers may use a stale average until the TTL expires.
+_avg_daily_emissions_cache = _ResultCache(max_size=4096, ttl_seconds=3600)
+
+# Marks hotels that are not in _avg_daily_emissions_cache
+_NOT_CACHED = object()
+
+def precompute_avg_daily_emissions(hotel_ids, db: Session) -> dict:
+    """
+    Average daily emissions of several hotels, from their utility bills.
     
-    # Add flight emissions
-    flights = db.query(models.FlightSegment).filter(models.FlightSegment.trip_id == trip_id).all()
-    for flight in flights:
-        total_carbon += calculate_flight_carbon(
-            flight.departure_airport,
-            flight.arrival_airport,
-            trip.number_of_tourists
-        )
+    Purpose: Hotel stay emissions are based on the hotel's average daily
+    emissions. Computing them for all hotels of one or more trips at once
+    takes a single grouped query, instead of loading every bill of every
+    hotel once per hotel stay.
     
-    # Add transport emissions
-    transports = db.query(models.LocalTransport).filter(models.LocalTransport.trip_id == trip_id).all()
-    for transport in transports:
-        total_carbon += calculate_transport_carbon(
-            transport.vehicle_type,
-            transport.distance_km,
-            trip.number_of_tourists
-        )
+    How it works:
+    1. The database sums the positive bill amounts and counts those bills
+       per (hotel, bill type), over ready bills only
+    2. Each type's sum is converted to emissions with its factor
+    3. A hotel's average daily emissions = its total emissions / (30 days * bills),
+       i.e. the average over its bills, each assumed to cover a month
+    
+    Results are cached per hotel (see _avg_daily_emissions_cache), so only
+    hotels not seen recently are queried.
+    
+    Args:
+        hotel_ids: IDs of the hotels to compute (any iterable)
+        db (Session): Database session
+    
+    Returns:
+        dict: {hotel_id: average kg CO2 per day}, only for hotels that have
+        bills with a positive amount
+    """
+    # Take what is cached, query the rest
+    avg_daily_emissions = {}
+    uncached_hotel_ids = []
+    for hotel_id in set(hotel_ids):
+        cached = _avg_daily_emissions_cache.get(hotel_id, _NOT_CACHED)
+        if cached is _NOT_CACHED:
+            uncached_hotel_ids.append(hotel_id)
+        elif cached is not None:
+            avg_daily_emissions[hotel_id] = cached
+    if not uncached_hotel_ids:
+        return avg_daily_emissions
+    
+    rows = db.query(
+        models.UtilityBill.hotel_id,
+        models.UtilityBill.bill_type,
+        summed_as_float(models.UtilityBill.bill_amount),
+        func.count()
+    ).filter(
+        models.UtilityBill.hotel_id.in_(uncached_hotel_ids),
+        models.UtilityBill.status == models.BILL_STATUS_READY,
+        models.UtilityBill.bill_amount > 0
+    ).group_by(
+        models.UtilityBill.hotel_id,
+        models.UtilityBill.bill_type
+    ).all()
+    
+    # Per hotel: [total emissions, number of bills]
+    totals = {}
+    for hotel_id, bill_type, total_amount, bill_count in rows:
+        hotel_totals = totals.setdefault(hotel_id, [0.0, 0])
+        hotel_totals[0] += total_amount * HOTEL_STAY_EMISSION_FACTORS[bill_type]
+        hotel_totals[1] += bill_count
+    
+    # Estimate days covered by each bill (assume monthly bills)
+    days_in_bill = 30
+    for hotel_id in uncached_hotel_ids:
+        average = None
+        if hotel_id in totals:
+            total_emissions, bill_count = totals[hotel_id]
+            average = total_emissions / (days_in_bill * bill_count)
+            avg_daily_emissions[hotel_id] = average
+        # Hotels without usable bills are cached too (as None)
+        _avg_daily_emissions_cache.put(hotel_id, average)
+    
+    return avg_daily_emissions
+
+def calculate_hotel_stay_carbon(hotel_id: int, nights: int, guests: int, avg_daily_emissions: dict) -> float:
+    """
+    Calculate carbon emissions for hotel stays based on hotel's average consumption.
+    
+    avg_daily_emissions is the result of precompute_avg_daily_emissions() for
+    (at least) this hotel, so no database access happens here.
+    """
+    average_daily_emissions = avg_daily_emissions.get(hotel_id)
+    if average_daily_emissions is None:
+        # No usable bills - default hotel emission: 30 kg CO2 per room-night
+        return 30.0 * nights * (guests / 2)  # Assume 2 guests per room
+    
+    return average_daily_emissions * nights * (guests / 2)  # Per room calculation
+
+def calculate_trip_total_carbon(trip, hotel_stays: list, travel_carbon: dict, avg_daily_emissions: dict) -> float:
+    """
+    Calculate total carbon footprint for a trip.
+    
+    Works on an already loaded trip (any object or row with .id and
+    .number_of_tourists), its load_hotel_stays() entry and the
+    precompute_travel_carbon() / precompute_avg_daily_emissions() results
+    for it, so it runs no queries; callers handling many trips load and
+    precompute once for all.
+    """
+    # Add flight and transport emissions
+    total_carbon = travel_carbon.get(trip.id, 0.0) * trip.number_of_tourists
     
     # Add hotel emissions
-    hotel_stays = db.query(models.HotelStay).filter(models.HotelStay.trip_id == trip_id).all()
     for stay in hotel_stays:
         total_carbon += calculate_hotel_stay_carbon(
             stay.hotel_id,
             stay.number_of_nights,
             trip.number_of_tourists,
-            db
+            avg_daily_emissions
         )
     
     return total_carbon
@@ -872,11 +1556,11 @@ def get_trip_carbon_breakdown(trip_id: int, db: Session) -> dict:
 # You could add additional endpoints like:
 #
 # @router.get("/bills/{bill_id}")
-# def get_bill_details(bill_id: int, current_hotel: dict = Depends(get_current_hotel)):
+# def get_bill_details(bill_id: int, current_hotel: HotelClaims = Depends(get_current_hotel)):
 #     """Get details of a specific bill"""
 #
 # @router.delete("/bills/{bill_id}")
-# def delete_bill(bill_id: int, current_hotel: dict = Depends(get_current_hotel)):
+# def delete_bill(bill_id: int, current_hotel: HotelClaims = Depends(get_current_hotel)):
 #     """Delete a specific bill"""
 #
 # @trip_router.put("/{trip_id}")
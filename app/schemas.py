@@ -23,9 +23,14 @@
 # - Travel Agent schemas: Registration, trip management, carbon calculations
 # =============================================================================
 
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from fastapi import Form
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, ValidationError, field_serializer, field_validator, model_validator
+from pydantic_core import PydanticCustomError
+from typing import Annotated, Literal, Optional, List
+from dataclasses import dataclass
 from datetime import datetime
+from decimal import Decimal
 
 # =============================================================================
 # HOTEL-RELATED SCHEMAS
@@ -109,19 +114,38 @@ class TravelAgentLogin(BaseModel):
 # TRIP-RELATED SCHEMAS
 # =============================================================================
 
+# Shared settings of the trip input models (a trip request can carry many
+# nested segments, all validated by pydantic-core):
+# - extra="ignore": unknown keys are dropped without building anything for them
+# - frozen=True: the validated input is read-only (routes only read it)
+# - str_strip_whitespace=True: surrounding spaces are stripped while validating
+TRIP_INPUT_CONFIG = ConfigDict(extra="ignore", frozen=True, str_strip_whitespace=True)
+
+# Constrained string types, reusable across fields
+# The constraints live in the type, checked by pydantic-core like Field(...)
+# limits but without repeating them on every field
+AirportCode = Annotated[str, StringConstraints(strip_whitespace=True, min_length=3, max_length=10)]
+TripName = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=255)]
+
 class FlightSegmentCreate(BaseModel):
     """Schema for creating flight segments within a trip"""
-    departure_airport: str = Field(..., min_length=3, max_length=10, description="Departure airport code")
-    arrival_airport: str = Field(..., min_length=3, max_length=10, description="Arrival airport code")
+    model_config = TRIP_INPUT_CONFIG
+    
+    departure_airport: AirportCode = Field(..., description="Departure airport code")
+    arrival_airport: AirportCode = Field(..., description="Arrival airport code")
     transit_airports: Optional[str] = Field(None, description="Comma-separated transit airport codes")
 
 class LocalTransportCreate(BaseModel):
     """Schema for creating local transport records within a trip"""
+    model_config = TRIP_INPUT_CONFIG
+    
     vehicle_type: str = Field(..., description="Vehicle type (bus, car, train, taxi)")
     distance_km: float = Field(..., gt=0, description="Distance traveled in kilometers")
 
 class HotelStayCreate(BaseModel):
     """Schema for creating hotel stay records within a trip"""
+    model_config = TRIP_INPUT_CONFIG
+    
     hotel_id: int = Field(..., description="ID of the hotel where tourists stayed")
     number_of_nights: int = Field(..., gt=0, description="Number of nights stayed")
     check_in_date: datetime = Field(..., description="Check-in date")
@@ -136,7 +160,9 @@ class TripCreate(BaseModel):
     
     Used by: POST /trips/create endpoint
     """
-    trip_name: str = Field(..., min_length=1, max_length=255, description="Trip name")
+    model_config = TRIP_INPUT_CONFIG
+    
+    trip_name: TripName = Field(..., description="Trip name")
     trip_description: Optional[str] = Field(None, description="Trip description")
     number_of_tourists: int = Field(..., gt=0, description="Number of tourists")
     start_date: datetime = Field(..., description="Trip start date")
@@ -173,36 +199,37 @@ class TripCarbonResponse(BaseModel):
     transport_details: List[dict] = Field(default=[], description="Transport carbon breakdown")
     hotel_details: List[dict] = Field(default=[], description="Hotel carbon breakdown")
 
-class BillUploadResponse(BaseModel):
-    """
-    Schema for bill upload success responses.
-    
-    Purpose: Defines what data is returned immediately after a successful
-    bill upload. Provides confirmation and essential information.
-    
-    Used by: POST /bills/upload endpoint response
-    
-    Response Example:
-        {
-            "id": 123,
-            "bill_type": "electricity",
-            "bill_month": 3,
-            "bill_year": 2024,
-            "file_url": "https://bucket.s3.amazonaws.com/bill.pdf",
-            "message": "Bill uploaded successfully"
-        }
-    """
-    id: int = Field(..., description="Unique identifier of uploaded bill")
-    bill_type: str = Field(..., description="Type of bill uploaded")
-    bill_month: int = Field(..., description="Month of uploaded bill")
-    bill_year: int = Field(..., description="Year of uploaded bill")
-    file_url: str = Field(..., description="URL where uploaded file is stored")
-    message: str = Field(..., description="Success message")
-
 # =============================================================================
 # UTILITY BILL-RELATED SCHEMAS
 # =============================================================================
 
+# Accepted units per bill type, as listed in error messages
+VALID_UNITS = {
+    "electricity": ("kWh", "kw", "kwh", "kilowatt-hours", "units"),
+    "water": ("liters", "litres", "gallons", "cubic meters", "m3", "l", "gal")
+}
+
+# Lowercased sets of the same units for case-insensitive O(1) membership checks
+# Built once at import instead of on every upload request
+VALID_UNITS_LOWER = {
+    bill_type: frozenset(u.lower() for u in units)
+    for bill_type, units in VALID_UNITS.items()
+}
+
+# Consumption amount of a bill: the same precision as the NUMERIC(12, 3)
+# bill_amount column (up to 999,999,999.999), never negative
+# Parsed once by pydantic-core at the validation boundary; code after it works
+# with the Decimal and never parses the amount again
+BillAmount = Annotated[Decimal, Field(max_digits=12, decimal_places=3, ge=0)]
+
+# Billing period of a bill
+# The twelve months are a Literal, validated by a lookup in pydantic-core and
+# published as an enum in the OpenAPI schema. Years only have a lower bound
+# here: uploads additionally cap them at next year (see BillUploadForm), and
+# stored bills must stay readable whatever year they are for.
+BillMonth = Literal[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+BillYear = Annotated[int, Field(ge=2020)]
+
 class UtilityBillBase(BaseModel):
     """
     Base schema containing common utility bill fields.
@@ -214,37 +241,100 @@ class UtilityBillBase(BaseModel):
     - Reduces code duplication
     - Ensures consistency across related schemas
     - Makes maintenance easier
+    
+    Configuration (inherited by all subclasses):
+    - from_attributes=True: Allows creating Pydantic objects from SQLAlchemy models
+      (UtilityBill.model_validate(sqlalchemy_bill_object); for trusted database
+      rows use UtilityBill.from_orm_fast)
+    - frozen=True: Bills are read-only once built (and hashable)
+    - extra="forbid": Unknown fields are rejected instead of silently kept
     """
+    model_config = ConfigDict(from_attributes=True, frozen=True, extra="forbid")
+    
     bill_type: str = Field(..., description="Type of bill (electricity, water, etc.)")
-    bill_month: int = Field(..., ge=1, le=12, description="Month (1-12)")
-    bill_year: int = Field(..., ge=2020, le=2030, description="Year")
-    bill_amount: str = Field(..., description="Consumption amount from the bill (e.g., '450', '1250.5')")
+    bill_month: BillMonth = Field(..., description="Month (1-12)")
+    bill_year: BillYear = Field(..., description="Year")
+    bill_amount: BillAmount = Field(..., description="Consumption amount from the bill (e.g., '450', '1250.5')")
     unit: str = Field(..., description="Unit of measurement (e.g., 'kWh', 'liters', 'gallons')")
 
-class UtilityBillCreate(UtilityBillBase):
+class BillUploadForm(BaseModel):
     """
-    Schema for creating new utility bills.
-    
-    Purpose: Validates data when hotels upload new utility bills.
-    Inherits common fields from UtilityBillBase and adds amount/unit validation.
+    Schema for the form fields of a bill upload.
     
-    Used by: POST /bills/upload endpoint (along with file upload)
+    Purpose: Parses and validates all bill fields in a single pydantic pass,
+    replacing a chain of hand-written checks in the endpoint.
     
-    Note: This schema is used for form data validation.
-    The actual file is handled separately by FastAPI's UploadFile.
+    Used by: POST /bills/upload endpoint, via Depends(BillUploadForm.as_form)
+    (the file itself is handled separately by FastAPI's UploadFile)
     
-    Important Fields for Carbon Calculation:
-    - bill_amount: The exact consumption amount from the bill
-    - unit: The measurement unit (kWh for electricity, liters for water, etc.)
-    
-    Example:
-        bill_type: "electricity"
-        bill_month: 3
-        bill_year: 2024
-        bill_amount: "1450.75"  # 1,450.75 kWh consumed
-        unit: "kWh"
+    Validation Rules:
+    - bill_type: "electricity" or "water"
+    - bill_month: 1-12
+    - bill_year: 2020 up to next year
+    - bill_amount: A finite, non-negative number with at most 3 decimals
+      (kept exact as a Decimal, see BillAmount)
+    - unit: Must be one of the units accepted for the bill type (any case)
+    
+    Invalid data is rejected with a 422 response listing every failing field.
     """
-    pass  # Inherits all fields from UtilityBillBase
+    bill_type: Literal["electricity", "water"] = Field(..., description="Type of bill")
+    bill_month: BillMonth = Field(..., description="Month (1-12)")
+    bill_year: BillYear = Field(..., description="Year (2020 to next year)")
+    bill_amount: BillAmount = Field(..., description="Consumption amount from the bill")
+    unit: str = Field(..., description="Unit of measurement (e.g., 'kWh', 'liters')")
+
+    @field_validator("bill_year")
+    @classmethod
+    def check_year_not_in_future(cls, bill_year: int) -> int:
+        """Reject years after next year (the bound moves with the calendar)."""
+        max_year = datetime.now().year + 1
+        if bill_year > max_year:
+            raise PydanticCustomError(
+                "bill_year_too_large",
+                "Invalid year. Must be between 2020 and {max_year}",
+                {"max_year": max_year}
+            )
+        return bill_year
+
+    @model_validator(mode="after")
+    def check_unit_matches_type(self) -> "BillUploadForm":
+        """Reject units that don't belong to the bill type (case-insensitive)."""
+        if self.unit.lower() not in VALID_UNITS_LOWER[self.bill_type]:
+            raise PydanticCustomError(
+                "bill_unit",
+                "Invalid unit for {bill_type}. Valid units: {valid_units}",
+                {"bill_type": self.bill_type, "valid_units": ", ".join(VALID_UNITS[self.bill_type])}
+            )
+        return self
+
+    @classmethod
+    def as_form(
+        cls,
+        bill_type: str = Form(...),        # electricity, water
+        bill_month: int = Form(...),       # 1-12
+        bill_year: int = Form(...),        # 2023, 2024...
+        bill_amount: str = Form(...),      # Consumption amount from the bill
+        unit: str = Form(...),             # Unit of measurement (kWh, liters, etc.)
+    ) -> "BillUploadForm":
+        """
+        FastAPI dependency that builds the form model from multipart form fields.
+        
+        Validation errors are raised as RequestValidationError, so clients get
+        the same 422 response format as for any other invalid request body.
+        """
+        try:
+            return cls(
+                bill_type=bill_type,
+                bill_month=bill_month,
+                bill_year=bill_year,
+                bill_amount=bill_amount,
+                unit=unit
+            )
+        except ValidationError as exc:
+            # Report the fields under "body", like FastAPI's own body errors
+            raise RequestValidationError(
+                [{**error, "loc": ("body", *error["loc"])} for error in exc.errors()]
+            )
 
 class UtilityBill(UtilityBillBase):
     """
@@ -258,7 +348,6 @@ class UtilityBill(UtilityBillBase):
     Additional fields beyond UtilityBillBase:
     - id: Database primary key
     - hotel_id: Which hotel owns this bill
-    - hotel_name: Name of the hotel (for convenience)
     - file_url: Where the bill file is stored
     - uploaded_at: When the bill was uploaded
     
@@ -271,27 +360,62 @@ class UtilityBill(UtilityBillBase):
             "bill_amount": "1450.75",
             "unit": "kWh",
             "hotel_id": 456,
-            "hotel_name": "Grand Resort Hotel",
-            "file_url": "https://bucket.s3.amazonaws.com/bill.pdf",
-            "uploaded_at": "2024-03-15T10:30:00"
+            "file_url": "https://bucket.s3.ap-south-1.amazonaws.com/bill.pdf",
+            "uploaded_at": "2024-03-15T10:30:00Z"
         }
     """
     id: int = Field(..., description="Unique bill identifier")
     hotel_id: int = Field(..., description="ID of hotel that owns this bill")
-    hotel_name: str = Field(..., description="Name of hotel that owns this bill")
     file_url: str = Field(..., description="URL where bill file is stored")
-    uploaded_at: datetime = Field(..., description="When bill was uploaded")
+    uploaded_at: datetime = Field(..., description="When bill was uploaded (UTC)")
+
+    @field_serializer("uploaded_at", when_used="json")
+    def serialize_uploaded_at(self, uploaded_at: datetime) -> str:
+        """Write the (naive UTC) upload time with a "Z" suffix, like GET /bills/my-bills."""
+        return uploaded_at.isoformat() + "Z"
 
-    class Config:
+    @classmethod
+    def from_orm_fast(cls, obj) -> "UtilityBill":
         """
-        Pydantic configuration for this schema.
+        Build a UtilityBill from a trusted database row, without validation.
         
-        from_attributes=True: Allows creating Pydantic objects from SQLAlchemy models
-        This enables: UtilityBill.from_orm(sqlalchemy_bill_object)
+        Purpose: Rows read from the database already have the right types, so
+        running every field validator again (as model_validate does) is wasted
+        work on response paths. model_construct just sets the fields.
+        
+        Args:
+            obj: A UtilityBill database object (or row with the same columns)
+        
+        Returns:
+            UtilityBill: The unvalidated model
         """
-        from_attributes = True
+        return cls.model_construct(
+            id=obj.id,
+            bill_type=obj.bill_type,
+            bill_month=obj.bill_month,
+            bill_year=obj.bill_year,
+            bill_amount=obj.bill_amount,
+            unit=obj.unit,
+            hotel_id=obj.hotel_id,
+            file_url=obj.file_url,
+            uploaded_at=obj.uploaded_at
+        )
 
-class BillUploadResponse(BaseModel):
+class BillList(BaseModel):
+    """
+    Schema for the list of a hotel's utility bills.
+    
+    Purpose: Response model of GET /bills/my-bills, documenting its shape.
+    The hotel's name is given once for the whole list instead of on every
+    bill (hotel_id is still on each bill).
+    
+    Used by: GET /bills/my-bills endpoint response
+    """
+    hotel_name: str = Field(..., description="Name of the hotel the bills belong to")
+    bills: List[UtilityBill] = Field(..., description="All bills of the hotel")
+
+@dataclass(slots=True, frozen=True)
+class BillUploadResponse:
     """
     Schema for bill upload success responses.
     
@@ -301,6 +425,13 @@ class BillUploadResponse(BaseModel):
     
     Used by: POST /bills/upload endpoint response
     
+    Why a dataclass (not a pydantic model)?
+    - Every value comes from the server (the already validated upload form,
+      the new bill id and file URL), so there is nothing to validate
+    - It is built once per upload and serialized right away: orjson encodes
+      (slotted) dataclasses natively, straight to JSON bytes
+    The field descriptions still appear in the OpenAPI schema.
+    
     Response Example:
         {
             "id": 123,
@@ -309,18 +440,20 @@ class BillUploadResponse(BaseModel):
             "bill_year": 2024,
             "bill_amount": "1450.75",
             "unit": "kWh",
-            "file_url": "https://bucket.s3.amazonaws.com/bill.pdf",
+            "file_url": "https://bucket.s3.ap-south-1.amazonaws.com/bill.pdf",
             "message": "Bill uploaded successfully"
         }
     """
-    id: int = Field(..., description="Unique identifier of uploaded bill")
-    bill_type: str = Field(..., description="Type of bill uploaded")
-    bill_month: int = Field(..., description="Month of uploaded bill")
-    bill_year: int = Field(..., description="Year of uploaded bill")
-    bill_amount: str = Field(..., description="Consumption amount from the bill")
-    unit: str = Field(..., description="Unit of measurement")
-    file_url: str = Field(..., description="URL where uploaded file is stored")
-    message: str = Field(..., description="Success message")
+    id: Annotated[int, Field(description="Unique identifier of uploaded bill")]
+    bill_type: Annotated[str, Field(description="Type of bill uploaded")]
+    bill_month: Annotated[int, Field(description="Month of uploaded bill")]
+    bill_year: Annotated[int, Field(description="Year of uploaded bill")]
+    # Text of the (Decimal) amount in plain notation, e.g. "1450.75" (see
+    # routes.format_bill_amount) - orjson has no Decimal type
+    bill_amount: Annotated[str, Field(description="Consumption amount from the bill")]
+    unit: Annotated[str, Field(description="Unit of measurement")]
+    file_url: Annotated[str, Field(description="URL where uploaded file is stored")]
+    message: Annotated[str, Field(description="Success message")]
 
 # =============================================================================
 # SCHEMA USAGE PATTERNS
@@ -338,7 +471,9 @@ class BillUploadResponse(BaseModel):
 #        return bills  # Automatically converted to UtilityBill schema format
 #
 # 3. MANUAL CONVERSION:
-#    db_bill = UtilityBillModel(...)  # SQLAlchemy model
-#    response_bill = UtilityBill.from_orm(db_bill)  # Convert to Pydantic schema
+#    db_bill = db.get(UtilityBillModel, bill_id)  # SQLAlchemy model
+#    response_bill = UtilityBill.from_orm_fast(db_bill)  # Convert to Pydantic schema
+#    # Data from the database is trusted: from_orm_fast skips validation.
+#    # Keep model_validate for untrusted input (e.g. data from API clients).
 #
 # =============================================================================